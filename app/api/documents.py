@@ -1,8 +1,13 @@
+import tempfile
+
+from cachetools import TTLCache
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
+from app.core.config import get_settings
 from app.core.database import get_db
 from app.models.documents import Document, DocumentChunk
 from app.schemas.document import (
@@ -15,6 +20,10 @@ from app.services.document_service import document_service
 from app.services.embedding_service import embedding_service
 from app.services.vector_service import vector_service
 
+settings = get_settings()
+
+# Snapshot cache for the stats endpoint; entries expire after 30 seconds
+_stats_cache: TTLCache = TTLCache(maxsize=1, ttl=30)
 router = APIRouter(prefix="/api/documents", tags=["documents"])
 
 @router.post("/upload", response_model=DocumentUploadResponse)
@@ -24,7 +33,7 @@ async def upload_document(
     department: str = Form(...),
     content_type: str = Form(...),
     uploaded_by: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Upload and process a new document
@@ -36,29 +45,39 @@ async def upload_document(
     - **uploaded_by**: Email/name of person uploading
     """
     
-    # Validate file type
-    allowed_extensions = {".pdf", ".docx", ".txt", ".md"}
+    # Validate file type against the configured whitelist
     file_extension = None
     if file.filename:
         file_extension = "." + file.filename.split(".")[-1].lower()
     
-    if file_extension not in allowed_extensions:
+    if file_extension not in settings.allowed_extensions_set:
         raise HTTPException(
             status_code=400, 
-            detail=f"Unsupported file type. Allowed: {allowed_extensions}"
+            detail=f"Unsupported file type. Allowed: {settings.ALLOWED_FILE_EXTENSIONS}"
         )
     
     try:
-        # Read file content
-        file_content = await file.read()
+        # Stream the upload to a spooled temp file in 1MB chunks so large
+        # files never sit fully in memory, rejecting oversized uploads early
+        spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        total_size = 0
+        while chunk := await file.read(1024 * 1024):
+            total_size += len(chunk)
+            if total_size > settings.MAX_FILE_SIZE:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE} bytes"
+                )
+            spool.write(chunk)
         
-        if len(file_content) == 0:
+        if total_size == 0:
             raise HTTPException(status_code=400, detail="Empty file")
         
         # Process document through the complete pipeline
-        document = await document_service.process_document(
+        document, chunks_count = await document_service.process_document(
             db=db,
-            file_content=file_content,
+            file=spool,
+            file_size=total_size,
             filename=file.filename,
             title=title,
             department=department,
@@ -66,11 +85,6 @@ async def upload_document(
             uploaded_by=uploaded_by
         )
         
-        # Count chunks created
-        chunks_count = db.query(DocumentChunk).filter(
-            DocumentChunk.document_id == document.id
-        ).count()
-        
         return DocumentUploadResponse(
             id=document.id,
             title=document.title,
@@ -78,13 +92,15 @@ async def upload_document(
             chunks_created=chunks_count
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
 
 @router.post("/search", response_model=DocumentSearchResponse)
 async def search_documents(
     search_request: DocumentSearchRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Search documents using semantic similarity
@@ -96,58 +112,69 @@ async def search_documents(
     """
     
     try:
-        # Generate embedding for the search query
-        query_embedding = embedding_service.generate_embedding(search_request.query)
+        # Generate embedding for the search query (cached for hot queries)
+        query_embedding = embedding_service.generate_query_embedding(search_request.query)
+        
+        # Build a metadata filter so the vector store prunes server-side and
+        # returns exactly the requested number of matching chunks
+        filters = []
+        if search_request.department:
+            filters.append({"department": search_request.department})
+        if search_request.content_type:
+            filters.append({"content_type": search_request.content_type})
+        
+        where = None
+        if len(filters) == 1:
+            where = filters[0]
+        elif filters:
+            where = {"$and": filters}
         
         # Search for similar chunks in vector database
         vector_results = vector_service.search_similar_chunks(
             query_embedding=query_embedding,
-            n_results=search_request.limit * 2  # Get more to allow filtering
+            n_results=search_request.limit,
+            where=where
         )
         
         # Extract document IDs and chunk info from vector results
-        chunk_results = []
-        document_ids = set()
-        
-        for i, (doc_text, distance, metadata, chunk_id) in enumerate(zip(
-            vector_results["documents"],
-            vector_results["distances"], 
-            vector_results["metadatas"],
-            vector_results["ids"]
-        )):
-            # Convert distance to similarity score (higher = more similar)
-            relevance_score = 1 - distance
-            
-            # Apply filters if specified
-            if search_request.department and metadata.get("department") != search_request.department:
-                continue
-            if search_request.content_type and metadata.get("content_type") != search_request.content_type:
-                continue
-            
-            chunk_results.append({
+        chunk_results = [
+            {
                 "content": doc_text,
                 "chunk_index": metadata.get("chunk_index", 0),
-                "relevance_score": relevance_score,
+                # Convert distance to similarity score (higher = more similar)
+                "relevance_score": 1 - distance,
                 "document_id": metadata.get("document_id"),
                 "vector_id": chunk_id
-            })
-            
-            document_ids.add(metadata.get("document_id"))
-            
-            if len(chunk_results) >= search_request.limit:
-                break
+            }
+            for doc_text, distance, metadata, chunk_id in zip(
+                vector_results["documents"],
+                vector_results["distances"],
+                vector_results["metadatas"],
+                vector_results["ids"]
+            )
+        ]
+        document_ids = {chunk["document_id"] for chunk in chunk_results}
         
-        # Get full document information from SQL database
+        # Get full document information from SQL database in one query,
+        # then reorder to match the vector relevance ranking
         documents = []
         if document_ids:
-            documents_query = db.query(Document).filter(
-                Document.id.in_(document_ids),
-                Document.is_active == True
+            result = await db.execute(
+                select(Document).where(
+                    Document.id.in_(document_ids),
+                    Document.is_active == True
+                )
             )
-            documents = documents_query.all()
+            by_id = {doc.id: doc for doc in result.scalars()}
+            seen = set()
+            for chunk in chunk_results:
+                doc = by_id.get(chunk["document_id"])
+                if doc and doc.id not in seen:
+                    documents.append(doc)
+                    seen.add(doc.id)
         
         return DocumentSearchResponse(
-            documents=[DocumentResponse.from_orm(doc) for doc in documents],
+            documents=[DocumentResponse.model_validate(doc) for doc in documents],
             chunks=chunk_results,
             total_results=len(chunk_results),
             query=search_request.query
@@ -162,7 +189,7 @@ async def list_documents(
     content_type: Optional[str] = None,
     limit: int = 20,
     offset: int = 0,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     List all documents with optional filtering
@@ -173,48 +200,58 @@ async def list_documents(
     - **offset**: Number of documents to skip (for pagination)
     """
     
-    query = db.query(Document).filter(Document.is_active == True)
+    # Select only the columns the response needs - avoids hydrating full ORM
+    # rows and per-object lazy loads just to serialize them again
+    query = select(
+        Document.id, Document.title, Document.department, Document.content_type,
+        Document.file_size, Document.original_filename, Document.uploaded_by,
+        Document.uploaded_at, Document.is_active
+    ).where(Document.is_active == True)
     
     # Apply filters
     if department:
-        query = query.filter(Document.department == department)
+        query = query.where(Document.department == department)
     if content_type:
-        query = query.filter(Document.content_type == content_type)
+        query = query.where(Document.content_type == content_type)
     
     # Apply pagination
-    documents = query.offset(offset).limit(limit).all()
+    result = await db.execute(query.offset(offset).limit(limit))
     
-    return [DocumentResponse.from_orm(doc) for doc in documents]
+    return result.mappings().all()
 
 @router.get("/{document_id}", response_model=DocumentResponse)
 async def get_document(
     document_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get detailed information about a specific document
     """
     
-    document = db.query(Document).filter(
-        Document.id == document_id,
-        Document.is_active == True
-    ).first()
+    result = await db.execute(
+        select(Document).where(
+            Document.id == document_id,
+            Document.is_active == True
+        )
+    )
+    document = result.scalar_one_or_none()
     
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    return DocumentResponse.from_orm(document)
+    return DocumentResponse.model_validate(document)
 
 @router.delete("/{document_id}")
 async def delete_document(
     document_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Delete a document and all its chunks
     """
     
-    document = db.query(Document).filter(Document.id == document_id).first()
+    result = await db.execute(select(Document).where(Document.id == document_id))
+    document = result.scalar_one_or_none()
     
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -225,32 +262,49 @@ async def delete_document(
         
         # Soft delete in SQL (mark as inactive)
         document.is_active = False
-        db.commit()
+        await db.commit()
         
         return {"message": f"Document '{document.title}' deleted successfully"}
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Error deleting document: {str(e)}")
 
 @router.get("/stats/overview")
-async def get_stats(db: Session = Depends(get_db)):
+async def get_stats(db: AsyncSession = Depends(get_db)):
     """
     Get system statistics
     """
     
-    total_documents = db.query(Document).filter(Document.is_active == True).count()
-    total_chunks = db.query(DocumentChunk).count()
+    # Aggregates only drift as documents are uploaded, so serve a
+    # 30-second-old snapshot instead of rescanning on every request
+    cached = _stats_cache.get("stats")
+    if cached is not None:
+        return cached
+    
+    result = await db.execute(
+        select(func.count()).select_from(Document).where(Document.is_active == True)
+    )
+    total_documents = result.scalar()
+    
+    result = await db.execute(select(func.count()).select_from(DocumentChunk))
+    total_chunks = result.scalar()
+    
     vector_stats = vector_service.get_collection_stats()
     
     # Get documents by department
-    dept_stats = db.query(Document.department, db.func.count(Document.id)).filter(
-        Document.is_active == True
-    ).group_by(Document.department).all()
+    result = await db.execute(
+        select(Document.department, func.count(Document.id)).where(
+            Document.is_active == True
+        ).group_by(Document.department)
+    )
+    dept_stats = result.all()
     
-    return {
+    stats = {
         "total_documents": total_documents,
         "total_chunks": total_chunks,
         "vector_chunks": vector_stats["total_chunks"],
         "departments": dict(dept_stats)
-    }
\ No newline at end of file
+    }
+    _stats_cache["stats"] = stats
+    return stats
\ No newline at end of file
@@ -1,9 +1,15 @@
+import logging
 import os
-from functools import lru_cache
-from typing import Optional, List
+from functools import cache, cached_property
+from typing import Literal, Optional, List
 from pydantic import BaseModel, Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+logger = logging.getLogger(__name__)
+
+# Sync scheme -> async driver scheme, consulted once per process
+_ASYNC_SCHEME_MAP = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
 class Settings(BaseSettings):
     """Application settings with environment variable support"""
 
@@ -16,13 +22,16 @@ class Settings(BaseSettings):
     APP_NAME: str = "Company Documentation Chatbot API"
     APP_VERSION: str = "2.0.0"
     DEBUG: bool = False
-    ENVIRONMENT: str = Field(default="development", description="Environment: development, staging, production")
+    ENVIRONMENT: Literal["development", "staging", "production"] = Field(default="development", description="Deployment environment")
     
     # Security Settings
     SECRET_KEY: str = Field(..., min_length=32, description="JWT secret key (min 32 chars)")
     ALGORITHM: str = Field(default="HS256", description="JWT algorithm")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(default=30, ge=1, le=1440, description="Token expiry in minutes")
-    
+    PASSWORD_HASH_TIME_COST: int = Field(default=2, ge=1, le=10, description="argon2 time cost (iterations)")
+    PASSWORD_HASH_MEMORY_COST: int = Field(default=19456, ge=8192, le=1048576, description="argon2 memory cost in KiB")
+    PASSWORD_HASH_WORKERS: Optional[int] = Field(default=None, ge=1, le=32, description="Hashing pool size (default: CPU count)")
+
     # Database Settings
     DATABASE_URL: str = Field(default="sqlite:///./data/database.db", description="Database connection URL")
     DATABASE_POOL_SIZE: int = Field(default=5, ge=1, le=50)
@@ -32,7 +41,7 @@ class Settings(BaseSettings):
     CHROMA_DB_PATH: str = Field(default="./data/chroma_db", description="ChromaDB storage path")
     
     # OpenAI Settings
-    OPENAI_API_KEY: str = Field(..., description="OpenAI API key")
+    OPENAI_API_KEY: str = Field(..., pattern=r"^(sk-|org-)", description="OpenAI API key")
     OPENAI_MODEL: str = Field(default="gpt-3.5-turbo", description="OpenAI model to use")
     OPENAI_TEMPERATURE: float = Field(default=0.1, ge=0.0, le=2.0, description="LLM temperature")
     OPENAI_MAX_TOKENS: int = Field(default=1000, ge=100, le=4096, description="Max tokens in response")
@@ -56,6 +65,7 @@ class Settings(BaseSettings):
     RATE_LIMIT_REQUESTS_PER_MINUTE: int = Field(default=60, ge=10, le=1000)
     RATE_LIMIT_REQUESTS_PER_HOUR: int = Field(default=1000, ge=100, le=10000)
     RATE_LIMIT_ENABLED: bool = Field(default=True, description="Enable rate limiting")
+    REDIS_URL: Optional[str] = Field(default=None, description="Redis URL for shared rate limiting (falls back to in-process counters)")
     
     # CORS Settings
     CORS_ORIGINS: List[str] = Field(default=["*"], description="Allowed CORS origins")
@@ -89,13 +99,32 @@ class Settings(BaseSettings):
         env_file=".env",
         env_file_encoding="utf-8",
         case_sensitive=True,
-        extra="forbid"  # Forbid extra fields
+        extra="forbid",  # Forbid extra fields
+        frozen=True  # Settings are read-only after construction
     )
 
     @property
     def is_postgres(self) -> bool:
         return self.DATABASE_URL.startswith("postgresql")
     
+    @cached_property
+    def cors_origins_set(self) -> frozenset:
+        """CORS origins as a frozenset for O(1) membership checks"""
+        return frozenset(self.CORS_ORIGINS)
+    
+    @cached_property
+    def allowed_extensions_set(self) -> frozenset:
+        """Allowed upload extensions as a frozenset, lowercased"""
+        return frozenset(ext.lower() for ext in self.ALLOWED_FILE_EXTENSIONS)
+    
+    @cached_property
+    def database_url_async(self) -> str:
+        """DATABASE_URL rewritten to its async driver, computed once"""
+        scheme, sep, rest = self.DATABASE_URL.partition("://")
+        if not sep:
+            return self.DATABASE_URL
+        return f"{_ASYNC_SCHEME_MAP.get(scheme, scheme)}://{rest}"
+    
     @property
     def is_development(self) -> bool:
         return self.ENVIRONMENT == "development"
@@ -108,36 +137,6 @@ class Settings(BaseSettings):
     def is_staging(self) -> bool:
         return self.ENVIRONMENT == "staging"
     
-    @property
-    def database_url_async(self) -> str:
-        """Get async database URL for SQLAlchemy"""
-        if self.DATABASE_URL.startswith("sqlite"):
-            return self.DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://")
-        elif self.DATABASE_URL.startswith("postgresql"):
-            return self.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
-        return self.DATABASE_URL
-        
-    @field_validator('SECRET_KEY')
-    @classmethod
-    def validate_secret_key(cls, v):
-        if len(v) < 32:
-            raise ValueError("SECRET_KEY must be at least 32 characters long")
-        return v
-    
-    @field_validator('OPENAI_API_KEY')
-    @classmethod
-    def validate_openai_key(cls, v):
-        if not v or not v.startswith(("sk-", "org-")):
-            raise ValueError("OPENAI_API_KEY must be provided and start with 'sk-' or 'org-'")
-        return v
-    
-    @field_validator('ENVIRONMENT')
-    @classmethod
-    def validate_environment(cls, v):
-        if v not in ["development", "staging", "production"]:
-            raise ValueError("ENVIRONMENT must be one of: development, staging, production")
-        return v
-    
     @field_validator('CORS_ORIGINS')
     @classmethod
     def validate_cors_origins(cls, v):
@@ -154,10 +153,13 @@ class Settings(BaseSettings):
             raise ValueError("CHUNK_OVERLAP must be less than CHUNK_SIZE")
         return v
 
-@lru_cache()
+# Parsed once at import: every worker builds exactly one Settings object
+# instead of re-running env parsing and validators per cache miss
+settings = Settings()
+
 def get_settings() -> Settings:
-    """Get cached settings instance"""
-    return Settings()
+    """Get the shared settings instance"""
+    return settings
 
 # Environment-specific configurations
 class DevelopmentSettings(Settings):
@@ -169,7 +171,8 @@ class DevelopmentSettings(Settings):
         env_file=".env.development",
         env_file_encoding="utf-8",
         case_sensitive=True,
-        extra="forbid"
+        extra="forbid",
+        frozen=True
     )
 
 class ProductionSettings(Settings):
@@ -197,7 +200,8 @@ class ProductionSettings(Settings):
         env_file=".env.production",
         env_file_encoding="utf-8",
         case_sensitive=True,
-        extra="forbid"
+        extra="forbid",
+        frozen=True
     )
 
 class TestingSettings(Settings):
@@ -211,9 +215,11 @@ class TestingSettings(Settings):
         env_file=".env.testing",
         env_file_encoding="utf-8",
         case_sensitive=True,
-        extra="forbid"
+        extra="forbid",
+        frozen=True
     )
 
+@cache
 def get_environment_settings() -> Settings:
     """Get settings based on environment"""
     env = os.getenv("ENVIRONMENT", "development").lower()
@@ -225,6 +231,14 @@ def get_environment_settings() -> Settings:
     else:
         return DevelopmentSettings()
 
+def rebuild_from_cache(dump: dict) -> Settings:
+    """Rehydrate Settings from a model_dump() without re-running validators.
+    
+    Safe because the dump came from an instance that was already
+    validated; useful when handing settings to forked workers.
+    """
+    return Settings.model_construct(**dump)
+
 # Validation functions
 def validate_configuration():
     """Validate configuration on startup"""
@@ -242,20 +256,20 @@ def validate_configuration():
         
         # Validate file size
         if settings.MAX_FILE_SIZE > 100 * 1024 * 1024:  # 100MB
-            print("WARNING: MAX_FILE_SIZE is very large, consider reducing it")
+            logger.warning("MAX_FILE_SIZE is very large, consider reducing it")
         
         # Production-specific validations
         if settings.is_production:
             if settings.DEBUG:
                 raise ValueError("DEBUG must be False in production")
-            if "*" in settings.CORS_ORIGINS:
+            if "*" in settings.cors_origins_set:
                 raise ValueError("Wildcard CORS not allowed in production")
         
-        print(f"Configuration validated for {settings.ENVIRONMENT} environment")
+        logger.info("Configuration validated for %s environment", settings.ENVIRONMENT)
         return True
         
     except Exception as e:
-        print(f"Configuration validation failed: {e}")
+        logger.error("Configuration validation failed: %s", e)
         return False
 
 # Configuration summary for debugging
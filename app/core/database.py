@@ -1,9 +1,22 @@
 import os
-from sqlalchemy import create_engine
+import orjson
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from pathlib import Path
 
+from app.core.config import get_settings
+
+# JSON column values are serialized with orjson on every engine
+def _json_serializer(obj) -> str:
+    return orjson.dumps(obj).decode()
+
+_json_kwargs = {
+    "json_serializer": _json_serializer,
+    "json_deserializer": orjson.loads
+}
+
 
 # Get database URL from environment
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/database.db")
@@ -13,28 +26,75 @@ if DATABASE_URL.startswith("sqlite"):
     # SQLite configuration (local development)
     DATA_DIR = Path("data")
     DATA_DIR.mkdir(exist_ok=True)
-    
+
+    ASYNC_DATABASE_URL = get_settings().database_url_async
+
     engine = create_engine(
-        DATABASE_URL, 
-        connect_args={"check_same_thread": False}
+        DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        **_json_kwargs
     )
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **_json_kwargs)
+
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL + synchronous=NORMAL drops the two-fsync-per-commit cost of
+        # the default rollback journal; mmap and in-memory temp tables
+        # speed up reads on the dev database
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+    event.listens_for(engine, "connect")(_sqlite_pragmas)
+    event.listens_for(async_engine.sync_engine, "connect")(_sqlite_pragmas)
 else:
     # PostgreSQL configuration (production)
-    engine = create_engine(DATABASE_URL)
-    
+    _settings = get_settings()
+    ASYNC_DATABASE_URL = _settings.database_url_async
+
+    # Pool sizing comes from settings so deployments can tune it without
+    # code changes; recycling keeps connections ahead of server-side
+    # timeouts and pre-ping evicts ones the server already dropped.
+    engine = create_engine(
+        DATABASE_URL,
+        pool_size=_settings.DATABASE_POOL_SIZE,
+        max_overflow=_settings.DATABASE_MAX_OVERFLOW,
+        pool_recycle=1800,
+        pool_pre_ping=True,
+        future=True,
+        **_json_kwargs
+    )
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_size=_settings.DATABASE_POOL_SIZE,
+        max_overflow=_settings.DATABASE_MAX_OVERFLOW,
+        pool_recycle=1800,
+        pool_pre_ping=False,
+        **_json_kwargs
+    )
+
 # Create SessionLocal class - this handles database sessions
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# The sync engine/session is kept for scripts and table management;
+# request handlers use the async session below.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# Async session factory for request handlers
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
 
 # Base class for all our models
 Base = declarative_base()
 
 # Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 def create_tables():
     """Create all database tables"""
@@ -42,4 +102,4 @@ def create_tables():
 
 def drop_tables():
     """Drop all database tables (careful!)"""
-    Base.metadata.drop_all(bind=engine)
\ No newline at end of file
+    Base.metadata.drop_all(bind=engine)
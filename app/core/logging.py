@@ -0,0 +1,14 @@
+import logging
+from contextvars import ContextVar
+
+# Correlation ID for the current request; nested loggers pick it up
+# through the filter below without any manual plumbing
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp every record with the current request's correlation ID"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
@@ -1,14 +1,22 @@
+import logging
+import orjson
 import time
+from enum import IntFlag
+from hashlib import blake2b
 from typing import Optional, Dict, Callable
 from datetime import datetime, timedelta
 from fastapi import Request, HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-import redis
-from collections import defaultdict
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+import redis.asyncio as aioredis
+from cachetools import TTLCache
+from collections import deque
+from sortedcontainers import SortedList
 import asyncio
+import functools
 
-from app.core.database import get_db
+from app.core.database import AsyncSessionLocal, get_db
 from app.core.config import get_settings
 from app.models.auth import RateLimitLog
 from app.models.users import User
@@ -16,33 +24,101 @@ from app.services.auth_service import auth_service
 
 settings = get_settings()
 
+logger = logging.getLogger(__name__)
+
+# Hot-path constants: plain module globals instead of pydantic attribute
+# dispatch on every request
+_RATE_LIMIT_ENABLED = settings.RATE_LIMIT_ENABLED
+_RATE_LIMIT_PER_HOUR = settings.RATE_LIMIT_REQUESTS_PER_HOUR
+_FORWARDED_FOR_HEADER = "X-Forwarded-For"
+_REAL_IP_HEADER = "X-Real-IP"
+
 # HTTP Bearer token security
 security = HTTPBearer(auto_error=False)
 
+# Short-TTL cache of user_id -> User row for the JWT auth path, the single
+# hottest query in the app. Entries are dropped whenever a user is mutated.
+_user_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
+def invalidate_user_cache(user_id: int):
+    """Drop a cached user row (call after updating the user)"""
+    _user_cache.pop(user_id, None)
+
+def _request_endpoint(request: Request) -> str:
+    """"METHOD:path" for a request, built once and memoized on its state"""
+    endpoint = getattr(request.state, "endpoint", None)
+    if endpoint is None:
+        # scope["path"] is the raw string; request.url.path builds a URL object
+        endpoint = request.state.endpoint = request.method + ":" + request.scope["path"]
+    return endpoint
+
+# Verified-JWT cache: token digest -> decoded payload. HMAC verification
+# repeats identically for every request carrying the same token, so pay
+# it once per token per TTL window; the exp claim is still enforced.
+_jwt_cache: TTLCache = TTLCache(maxsize=10_000, ttl=300)
+
+def _decode_token_cached(token: str) -> Dict:
+    key = blake2b(token.encode(), digest_size=16).digest()
+    payload = _jwt_cache.get(key)
+    if payload is not None and payload.get("exp", 0) > time.time():
+        return payload
+    payload = auth_service.decode_token(token)
+    _jwt_cache[key] = payload
+    return payload
+
+def invalidate_token(token: str):
+    """Drop a cached token payload (call on logout/revocation)"""
+    _jwt_cache.pop(blake2b(token.encode(), digest_size=16).digest(), None)
+
 class SecurityMiddleware:
     def __init__(self):
-        # In-memory rate limiting (use Redis in production)
-        self.rate_limits = defaultdict(list)
-        self.blocked_ips = {}
+        # In-memory rate limiting (use Redis in production).
+        # Bounded deques of monotonic timestamps keyed by
+        # (identifier, endpoint); maxlen caps memory per client.
+        self.rate_limits: Dict[tuple, deque] = {}
+        # ip -> monotonic expiry time, with a parallel expiry-ordered list
+        # so a background sweeper can drop dead entries without scanning
+        self.blocked_ips: Dict[str, float] = {}
+        self._block_expiry: SortedList = SortedList()
+        self._block_sweeper_task: Optional[asyncio.Task] = None
         
-        # Initialize Redis if available
+        # Rate-limit log events are queued and flushed in batches off the
+        # request path; created lazily once an event loop is running
+        self._log_queue: Optional[asyncio.Queue] = None
+        self._log_flusher_task: Optional[asyncio.Task] = None
+        
+        # Shared rate-limit counters when Redis is configured; the
+        # in-memory fallback above only coordinates within one worker.
         self.redis_client = None
-        try:
-            if settings.is_production:
-                import redis
-                self.redis_client = redis.Redis(host='localhost', port=6379, db=0)
-        except ImportError:
-            pass
+        self._incr_script = None
+        if settings.REDIS_URL:
+            self.redis_client = aioredis.from_url(
+                settings.REDIS_URL,
+                decode_responses=False
+            )
+            # INCR + conditional EXPIRE as one cached server-side script,
+            # so a counter bump costs a single round-trip
+            self._incr_script = self.redis_client.register_script(
+                "local n = redis.call('INCR', KEYS[1]) "
+                "if n == 1 then redis.call('EXPIRE', KEYS[1], ARGV[1]) end "
+                "return n"
+            )
+
+    async def incr_rate_limit(self, identifier: str, endpoint: str, window_seconds: int = 3600) -> int:
+        """Atomically bump the shared request counter, returning the new count"""
+        return await self._incr_script(
+            keys=[f"rl:{identifier}:{endpoint}"], args=[window_seconds]
+        )
     
     def get_client_ip(self, request: Request) -> str:
         """Extract client IP address from request"""
         # Check X-Forwarded-For header (from reverse proxy)
-        forwarded_for = request.headers.get("X-Forwarded-For")
+        forwarded_for = request.headers.get(_FORWARDED_FOR_HEADER)
         if forwarded_for:
             return forwarded_for.split(",")[0].strip()
         
         # Check X-Real-IP header
-        real_ip = request.headers.get("X-Real-IP")
+        real_ip = request.headers.get(_REAL_IP_HEADER)
         if real_ip:
             return real_ip
         
@@ -51,63 +127,120 @@ class SecurityMiddleware:
     
     def is_rate_limited(self, identifier: str, endpoint: str, limit_per_hour: int = 1000) -> tuple[bool, int]:
         """Check if identifier is rate limited"""
-        now = datetime.utcnow()
-        hour_ago = now - timedelta(hours=1)
+        key = (identifier, endpoint)
+        now = time.monotonic()
+        hour_ago = now - 3600
+        
+        window = self.rate_limits.get(key)
+        if window is None:
+            window = self.rate_limits[key] = deque(maxlen=limit_per_hour)
         
-        # Clean old entries
-        self.rate_limits[f"{identifier}:{endpoint}"] = [
-            timestamp for timestamp in self.rate_limits[f"{identifier}:{endpoint}"]
-            if timestamp > hour_ago
-        ]
+        # Expire old entries from the left; each popleft is O(1), so the
+        # per-request cost stays constant instead of rebuilding the list
+        while window and window[0] <= hour_ago:
+            window.popleft()
         
-        current_count = len(self.rate_limits[f"{identifier}:{endpoint}"])
+        current_count = len(window)
         
         if current_count >= limit_per_hour:
             return True, 0  # Rate limited, no remaining requests
         
         # Add current request
-        self.rate_limits[f"{identifier}:{endpoint}"].append(now)
+        window.append(now)
         
         return False, limit_per_hour - current_count - 1
     
     def block_ip(self, ip_address: str, duration_minutes: int = 60):
         """Block an IP address temporarily"""
-        self.blocked_ips[ip_address] = datetime.utcnow() + timedelta(minutes=duration_minutes)
+        expiry = time.monotonic() + duration_minutes * 60
+        self.blocked_ips[ip_address] = expiry
+        self._block_expiry.add((expiry, ip_address))
+        
+        if self._block_sweeper_task is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return  # outside the server loop (scripts/tests)
+            self._block_sweeper_task = loop.create_task(self._block_sweeper())
     
     def is_ip_blocked(self, ip_address: str) -> bool:
         """Check if IP address is blocked"""
-        if ip_address in self.blocked_ips:
-            if datetime.utcnow() > self.blocked_ips[ip_address]:
-                del self.blocked_ips[ip_address]
-                return False
-            return True
-        return False
+        expiry = self.blocked_ips.get(ip_address)
+        return expiry is not None and time.monotonic() <= expiry
     
-    async def log_rate_limit(self, db: Session, identifier: str, endpoint: str, blocked: bool = False):
-        """Log rate limiting events"""
-        try:
-            rate_log = RateLimitLog(
-                identifier=identifier,
-                identifier_type="ip",
-                endpoint=endpoint,
-                requests_count=1,
-                window_start=datetime.utcnow(),
-                is_blocked=blocked,
-                block_until=datetime.utcnow() + timedelta(hours=1) if blocked else None
+    async def _block_sweeper(self):
+        """Periodically drop expired blocks so the working set stays bounded"""
+        while True:
+            await asyncio.sleep(10)
+            now = time.monotonic()
+            while self._block_expiry and self._block_expiry[0][0] <= now:
+                expiry, ip = self._block_expiry.pop(0)
+                # Only drop if the ip wasn't re-blocked with a later expiry
+                if self.blocked_ips.get(ip) == expiry:
+                    del self.blocked_ips[ip]
+    
+    def log_rate_limit(self, identifier: str, endpoint: str, blocked: bool = False):
+        """Queue a rate-limit event; a background task batches the inserts"""
+        if self._log_queue is None:
+            self._log_queue = asyncio.Queue(maxsize=10_000)
+            self._log_flusher_task = asyncio.get_running_loop().create_task(
+                self._log_flusher()
             )
+        
+        now = datetime.utcnow()
+        row = {
+            "identifier": identifier,
+            "identifier_type": "ip",
+            "endpoint": endpoint,
+            "requests_count": 1,
+            "window_start": now,
+            "is_blocked": blocked,
+            "block_until": now + timedelta(hours=1) if blocked else None
+        }
+        try:
+            self._log_queue.put_nowait(row)
+        except asyncio.QueueFull:
+            # Shedding log rows beats amplifying DB pressure during a flood
+            pass
+    
+    async def _log_flusher(self):
+        """Drain queued rate-limit events into batched inserts"""
+        while True:
+            rows = [await self._log_queue.get()]
+            
+            # Briefly let more events accumulate so one commit covers many
+            deadline = time.monotonic() + 0.5
+            while len(rows) < 200:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(await asyncio.wait_for(self._log_queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
             
-            db.add(rate_log)
-            db.commit()
-        except Exception as e:
-            print(f"Failed to log rate limit: {e}")
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(insert(RateLimitLog), rows)
+                    await db.commit()
+            except Exception as e:
+                logger.error("Failed to log rate limit: %s", e)
 
 # Dependency functions
 async def get_current_user(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
     """Get current authenticated user from JWT token"""
     
+    # Dependencies resolve independently, so a route that also pulls in
+    # rate_limit or a permission check would verify the JWT and load the
+    # user several times per request; memoize on request.state instead.
+    memoized = getattr(request.state, "_auth_user", None)
+    if memoized is not None:
+        return memoized
+    
     if not credentials:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -116,8 +249,8 @@ async def get_current_user(
         )
     
     try:
-        # Decode JWT token
-        payload = auth_service.decode_token(credentials.credentials)
+        # Decode JWT token (cached after first verification)
+        payload = _decode_token_cached(credentials.credentials)
         user_id = payload.get("sub")
         
         if user_id is None:
@@ -126,14 +259,28 @@ async def get_current_user(
                 detail="Invalid token"
             )
         
-        # Get user from database
-        user = db.query(User).filter(User.id == int(user_id)).first()
+        # Get user from the short-TTL cache, falling back to the database.
+        # Cached rows are re-attached to this request's session so handlers
+        # that mutate and commit the user keep working.
+        uid = int(user_id)
+        cached = _user_cache.get(uid)
+        if cached is not None:
+            user = await db.merge(cached, load=False)
+        else:
+            # Session.get checks the identity map first and emits a simple
+            # SELECT by primary key, skipping per-call statement construction
+            user = await db.get(User, uid)
+            if user is not None:
+                _user_cache[uid] = user
+        
         if user is None or not user.is_active:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User not found or inactive"
             )
         
+        request.state._auth_user = user
+        request.state._jwt_payload = payload
         return user
         
     except HTTPException:
@@ -145,8 +292,9 @@ async def get_current_user(
         )
 
 async def get_current_user_optional(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Optional[User]:
     """Get current user if authenticated, otherwise None"""
     
@@ -154,13 +302,13 @@ async def get_current_user_optional(
         return None
     
     try:
-        return await get_current_user(credentials, db)
+        return await get_current_user(request, credentials, db)
     except HTTPException:
         return None
 
 async def get_api_key_user(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Optional[User]:
     """Get user from API key authentication"""
     
@@ -169,7 +317,7 @@ async def get_api_key_user(
     if not api_key:
         return None
     
-    user = auth_service.validate_api_key(db, api_key)
+    user = await auth_service.validate_api_key(db, api_key)
     if not user or not user.is_active:
         return None
     
@@ -178,7 +326,7 @@ async def get_api_key_user(
 async def get_authenticated_user(
     request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
     """Get authenticated user via JWT or API key"""
     
@@ -188,26 +336,45 @@ async def get_authenticated_user(
         return user
     
     # Fall back to JWT
-    return await get_current_user(credentials, db)
+    return await get_current_user(request, credentials, db)
 
+@functools.lru_cache(maxsize=None)
 def require_permission(permission: str):
     """Decorator to require specific permission"""
+    # Memoized so every endpoint guarding the same permission shares one
+    # checker closure (and FastAPI caches its dependency analysis of it)
+    detail = f"Permission '{permission}' required"
+    
     def permission_checker(user: User = Depends(get_current_user)) -> User:
         if not auth_service.check_user_permissions(user, permission):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
-                detail=f"Permission '{permission}' required"
+                detail=detail
             )
         return user
     return permission_checker
 
+class Role(IntFlag):
+    """Bitmask encoding of the closed role set on User.role"""
+    EMPLOYEE = 1
+    MANAGER = 2
+    ADMIN = 0xFFFF  # Admin can access everything
+
+_ROLE_MASKS = {"employee": Role.EMPLOYEE, "manager": Role.MANAGER, "admin": Role.ADMIN}
+
+@functools.lru_cache(maxsize=None)
 def require_role(role: str):
     """Decorator to require specific role"""
+    # Resolved once when the dependency is built; the per-request check
+    # is a single integer AND instead of two string compares
+    required_mask = int(_ROLE_MASKS[role])
+    detail = f"Role '{role}' required"
+    
     def role_checker(user: User = Depends(get_current_user)) -> User:
-        if user.role != role and user.role != "admin":  # Admin can access everything
+        if not int(_ROLE_MASKS.get(user.role, 0)) & required_mask:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
-                detail=f"Role '{role}' required"
+                detail=detail
             )
         return user
     return role_checker
@@ -215,44 +382,55 @@ def require_role(role: str):
 # Rate limiting dependency
 security_middleware = SecurityMiddleware()
 
-async def rate_limit(
+async def _rate_limit_disabled():
+    """No-op stand-in so disabled rate limiting skips every sub-dependency"""
+    return
+
+async def _rate_limit_enabled(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user: Optional[User] = Depends(get_current_user_optional)
 ):
     """Apply rate limiting to requests"""
     
-    if not settings.RATE_LIMIT_ENABLED:
-        return
-    
     # Get identifier for rate limiting
     if user:
         identifier = f"user:{user.id}"
         limit_per_hour = 2000  # Higher limit for authenticated users
     else:
         identifier = f"ip:{security_middleware.get_client_ip(request)}"
-        limit_per_hour = settings.RATE_LIMIT_REQUESTS_PER_HOUR
+        limit_per_hour = _RATE_LIMIT_PER_HOUR
     
-    endpoint = f"{request.method}:{request.url.path}"
+    endpoint = _request_endpoint(request)
     
     # Check if blocked
     ip_address = security_middleware.get_client_ip(request)
     if security_middleware.is_ip_blocked(ip_address):
-        await security_middleware.log_rate_limit(db, identifier, endpoint, blocked=True)
+        security_middleware.log_rate_limit(identifier, endpoint, blocked=True)
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="IP address temporarily blocked due to rate limit violations"
         )
     
-    # Check rate limit
-    is_limited, remaining = security_middleware.is_rate_limited(
-        identifier, endpoint, limit_per_hour
-    )
+    # Check rate limit: one Redis round-trip shared across workers when
+    # configured, otherwise the per-process window
+    if security_middleware.redis_client is not None:
+        try:
+            count = await security_middleware.incr_rate_limit(identifier, endpoint)
+            is_limited, remaining = count > limit_per_hour, max(0, limit_per_hour - count)
+        except aioredis.RedisError:
+            is_limited, remaining = security_middleware.is_rate_limited(
+                identifier, endpoint, limit_per_hour
+            )
+    else:
+        is_limited, remaining = security_middleware.is_rate_limited(
+            identifier, endpoint, limit_per_hour
+        )
     
     if is_limited:
         # Block IP after repeated violations
         security_middleware.block_ip(ip_address, duration_minutes=60)
-        await security_middleware.log_rate_limit(db, identifier, endpoint, blocked=True)
+        security_middleware.log_rate_limit(identifier, endpoint, blocked=True)
         
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
@@ -270,10 +448,118 @@ async def rate_limit(
         "X-RateLimit-Remaining": str(remaining)
     }
 
+# When limiting is off (dev/tests) FastAPI would still resolve get_db and
+# the optional-user JWT decode before the early return; bind the no-op
+# instead so disabled means zero per-request cost
+rate_limit = _rate_limit_enabled if _RATE_LIMIT_ENABLED else _rate_limit_disabled
+
+def _client_ip_from_scope(scope) -> str:
+    """Client IP from raw ASGI headers, honoring proxy headers"""
+    real_ip = None
+    for name, value in scope["headers"]:
+        if name == b"x-forwarded-for":
+            return value.split(b",", 1)[0].strip().decode("latin-1")
+        if name == b"x-real-ip":
+            real_ip = value.decode("latin-1")
+    if real_ip:
+        return real_ip
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+class RateLimitMiddleware:
+    """Pure-ASGI rate limiting.
+
+    Rejected requests never reach FastAPI's dependency resolution, so a
+    429 costs no DB session, JWT decode or route matching.
+
+    Only /api/* paths are limited, matching the routers the dependency-
+    based limiter covered: / , /health and /docs stay unmetered so load
+    balancers and uptime probes polling them can't exhaust the budget.
+    """
+
+    # An IP is blocked only after this many rejected requests inside the
+    # violation window - one overrun just gets 429s until the hourly
+    # window drains, so a client that backs off recovers on its own
+    BLOCK_AFTER_VIOLATIONS = 50
+    VIOLATION_BLOCK_MINUTES = 10
+
+    def __init__(self, app):
+        self.app = app
+        self._violations: TTLCache = TTLCache(maxsize=10_000, ttl=600)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not _RATE_LIMIT_ENABLED
+            or not scope["path"].startswith("/api/")
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        ip_address = _client_ip_from_scope(scope)
+        identifier = "ip:" + ip_address
+        endpoint = scope["method"] + ":" + scope["path"]
+        
+        if security_middleware.is_ip_blocked(ip_address):
+            security_middleware.log_rate_limit(identifier, endpoint, blocked=True)
+            await self._reject(
+                scope, send,
+                "IP address temporarily blocked due to rate limit violations"
+            )
+            return
+        
+        if security_middleware.redis_client is not None:
+            try:
+                count = await security_middleware.incr_rate_limit(identifier, endpoint)
+                is_limited = count > _RATE_LIMIT_PER_HOUR
+                remaining = max(0, _RATE_LIMIT_PER_HOUR - count)
+            except aioredis.RedisError:
+                is_limited, remaining = security_middleware.is_rate_limited(
+                    identifier, endpoint, _RATE_LIMIT_PER_HOUR
+                )
+        else:
+            is_limited, remaining = security_middleware.is_rate_limited(
+                identifier, endpoint, _RATE_LIMIT_PER_HOUR
+            )
+        
+        if is_limited:
+            violations = self._violations.get(ip_address, 0) + 1
+            self._violations[ip_address] = violations
+            if violations >= self.BLOCK_AFTER_VIOLATIONS:
+                security_middleware.block_ip(
+                    ip_address, duration_minutes=self.VIOLATION_BLOCK_MINUTES
+                )
+            security_middleware.log_rate_limit(identifier, endpoint, blocked=True)
+            await self._reject(scope, send, "Rate limit exceeded", retry_after=True)
+            return
+        
+        scope.setdefault("state", {})["rate_limit_headers"] = {
+            "X-RateLimit-Limit": str(_RATE_LIMIT_PER_HOUR),
+            "X-RateLimit-Remaining": str(remaining)
+        }
+        await self.app(scope, receive, send)
+    
+    async def _reject(self, scope, send, detail: str, retry_after: bool = False):
+        headers = [(b"content-type", b"application/json")]
+        if retry_after:
+            headers.extend([
+                (b"x-ratelimit-limit", str(_RATE_LIMIT_PER_HOUR).encode()),
+                (b"x-ratelimit-remaining", b"0"),
+                (b"retry-after", b"3600")
+            ])
+        body = orjson.dumps({
+            "error": detail,
+            "status_code": 429,
+            "path": scope["path"]
+        })
+        await send({"type": "http.response.start", "status": 429, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
 # Audit logging decorator
 def audit_log(event_type: str, resource_type: str = None):
     """Decorator to automatically log audit events"""
     def decorator(func: Callable):
+        @functools.wraps(func)
         async def wrapper(*args, **kwargs):
             # Extract request, user, and db from kwargs
             request = kwargs.get('request')
@@ -283,7 +569,7 @@ def audit_log(event_type: str, resource_type: str = None):
             user_id = user.id if user else None
             ip_address = security_middleware.get_client_ip(request) if request else None
             user_agent = request.headers.get("User-Agent") if request else None
-            endpoint = f"{request.method}:{request.url.path}" if request else None
+            endpoint = _request_endpoint(request) if request else None
             
             try:
                 # Execute the original function
@@ -291,7 +577,7 @@ def audit_log(event_type: str, resource_type: str = None):
                 
                 # Log success
                 if db:
-                    auth_service.log_audit_event(
+                    await auth_service.log_audit_event(
                         db=db,
                         user_id=user_id,
                         event_type=event_type,
@@ -308,7 +594,7 @@ def audit_log(event_type: str, resource_type: str = None):
             except Exception as e:
                 # Log failure
                 if db:
-                    auth_service.log_audit_event(
+                    await auth_service.log_audit_event(
                         db=db,
                         user_id=user_id,
                         event_type=event_type,
@@ -1,18 +1,37 @@
 import os
+import sys
+
+# Swap in uvloop before anything touches the event loop, so dev runs and
+# tests get the Cython loop too (gunicorn's UvicornWorker already selects
+# it; uvloop/httptools ship with uvicorn[standard])
+if sys.platform != "win32":
+    import uvloop
+    uvloop.install()
+
+from pathlib import Path
 from fastapi import FastAPI, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.exceptions import HTTPException
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
+import asyncio
 import logging
+import orjson
+import logging.handlers
+import queue
+import random
 import time
+import uuid
 
 from app.api import documents, chat, auth
-from app.core.database import create_tables, get_db
+from app.core.logging import RequestIdFilter, request_id_var
+from app.core.database import AsyncSessionLocal, create_tables, get_db
 from app.core.config import get_settings, validate_configuration
-from app.core.security import security_middleware, rate_limit
+from app.core.security import security_middleware, RateLimitMiddleware
 from app.services.auth_service import auth_service
 from app.models.users import User
 from app.core.security import require_role
@@ -26,15 +45,35 @@ if not validate_configuration():
 
 settings = get_settings()
 
-# Configure logging
+# Scalars read on every hit of the root/health endpoints, bound once so
+# handlers avoid pydantic attribute dispatch per request
+_APP_VERSION = settings.APP_VERSION
+_ENVIRONMENT = settings.ENVIRONMENT
+_LLM_STATUS = "configured" if settings.OPENAI_API_KEY else "not_configured"
+_RATE_LIMIT_STATUS = "enabled" if settings.RATE_LIMIT_ENABLED else "disabled"
+
+# Configure logging. Handlers sit behind a queue so a log call from a
+# request coroutine never blocks on the file write; a listener thread
+# drains the queue into the real handlers.
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s')
+_file_handler = logging.FileHandler(settings.LOG_FILE)
+_file_handler.setFormatter(_log_formatter)
+_stream_handler = logging.StreamHandler()
+_stream_handler.setFormatter(_log_formatter)
+_queue_handler = logging.handlers.QueueHandler(_log_queue)
+# Message-only at the queue boundary; the listener's handlers apply the
+# real format (otherwise records get formatted twice)
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+_queue_handler.addFilter(RequestIdFilter())
 logging.basicConfig(
     level=getattr(logging, settings.LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(settings.LOG_FILE),
-        logging.StreamHandler()
-    ]
+    handlers=[_queue_handler]
 )
+_log_listener = logging.handlers.QueueListener(
+    _log_queue, _file_handler, _stream_handler, respect_handler_level=True
+)
+_log_listener.start()
 logger = logging.getLogger(__name__)
 
 # Create FastAPI app
@@ -44,7 +83,8 @@ app = FastAPI(
     version=settings.APP_VERSION,
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
-    openapi_url="/openapi.json" if settings.DEBUG else None
+    openapi_url="/openapi.json" if settings.DEBUG else None,
+    default_response_class=ORJSONResponse
 )
 
 # Security middleware
@@ -54,6 +94,10 @@ if settings.is_production:
         allowed_hosts=["*"]  # Configure for your domain in production
     )
 
+# Compress larger JSON responses (document lists, conversation history,
+# search results); level 5 trades a little ratio for low CPU cost
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -63,33 +107,65 @@ app.add_middleware(
     allow_headers=settings.CORS_HEADERS,
 )
 
-# Request logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    
-    # Log request
-    logger.info(f"Request: {request.method} {request.url}")
-    
-    response = await call_next(request)
-    
-    # Add rate limit headers if they exist
-    if hasattr(request.state, 'rate_limit_headers'):
-        for header, value in request.state.rate_limit_headers.items():
-            response.headers[header] = value
-    
-    # Log response time
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
-    
-    logger.info(f"Response: {response.status_code} ({process_time:.3f}s)")
-    
-    return response
+# Rate limiting runs as pure ASGI (inside the logging middleware so
+# rejections still get logged and timed); rejected requests never enter
+# FastAPI's dependency graph
+app.add_middleware(RateLimitMiddleware)
+
+# Orchestrator probes hit these every few seconds and would dominate the
+# log file; keep a 10% sample so liveness is still visible
+_SAMPLED_PATHS = frozenset({"/", "/health"})
+_ACCESS_LOG_SAMPLE_RATE = 0.1
+
+# Request logging middleware, written as pure ASGI: BaseHTTPMiddleware
+# would wrap every request/response in extra objects and buffer streaming
+class LogRequestsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter_ns()
+        request_id_var.set(uuid.uuid4().hex)
+        log_this = (
+            scope["path"] not in _SAMPLED_PATHS
+            or random.random() < _ACCESS_LOG_SAMPLE_RATE
+        )
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # Integer microseconds: no float math or format-spec parsing
+                process_time_us = (time.perf_counter_ns() - start_time) // 1000
+                headers = message["headers"]
+                headers.append((b"x-process-time-us", b"%d" % process_time_us))
+
+                # Rate limit headers stashed by the rate_limit dependency
+                rate_limit_headers = scope.get("state", {}).get("rate_limit_headers")
+                if rate_limit_headers:
+                    for header, value in rate_limit_headers.items():
+                        headers.append((header.encode(), value.encode()))
+
+                # One line per request, written at response time; request
+                # and response were previously two separate writes
+                if log_this:
+                    logger.info(
+                        "%s %s %s (%dus)",
+                        scope["method"], scope["path"],
+                        message["status"], process_time_us
+                    )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+app.add_middleware(LogRequestsMiddleware)
 
 # Error handling
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "error": exc.detail,
@@ -102,7 +178,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 async def general_exception_handler(request: Request, exc: Exception):
     logger.error(f"Unhandled exception: {exc}", exc_info=True)
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": "Internal server error",
@@ -112,9 +188,9 @@ async def general_exception_handler(request: Request, exc: Exception):
     )
 
 # Include API routers
-app.include_router(auth.router, dependencies=[Depends(rate_limit)])
-app.include_router(documents.router, dependencies=[Depends(rate_limit)])
-app.include_router(chat.router, dependencies=[Depends(rate_limit)])
+app.include_router(auth.router)
+app.include_router(documents.router)
+app.include_router(chat.router)
 
 # Startup event
 @app.on_event("startup")
@@ -126,16 +202,44 @@ async def startup_event():
     create_tables()
     logger.info("Database tables created/verified")
     
-    # Create admin user if specified
-    if settings.ADMIN_EMAIL and settings.ADMIN_PASSWORD:
-        try:
-            db = next(get_db())
-            existing_admin = db.query(User).filter(
-                User.email == settings.ADMIN_EMAIL
-            ).first()
-            
+    # Create admin user if specified, off the startup path so the server
+    # accepts connections without waiting on the bootstrap queries
+    if settings.ADMIN_EMAIL and settings.ADMIN_PASSWORD and _claim_admin_bootstrap():
+        asyncio.create_task(_ensure_admin())
+
+    # Hourly sweep of expired reset tokens and API keys
+    auth_service.start_cleanup_task()
+
+    logger.info("API is ready!")
+
+# Sentinel so only the first worker (and only the first boot) runs the
+# admin-exists query; keyed on the email so changing ADMIN_EMAIL re-runs
+_ADMIN_SENTINEL = Path("data") / ".admin_bootstrapped"
+
+def _claim_admin_bootstrap() -> bool:
+    """Return True if this process should run the admin bootstrap"""
+    try:
+        if _ADMIN_SENTINEL.read_text() == settings.ADMIN_EMAIL:
+            return False
+    except OSError:
+        pass
+    try:
+        _ADMIN_SENTINEL.write_text(settings.ADMIN_EMAIL)
+    except OSError:
+        pass  # read-only filesystem: still run the (idempotent) bootstrap
+    return True
+
+async def _ensure_admin():
+    """Create the configured admin user if it doesn't exist yet"""
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(User).where(func.lower(User.email) == settings.ADMIN_EMAIL.lower())
+            )
+            existing_admin = result.scalar_one_or_none()
+
             if not existing_admin:
-                admin_user = auth_service.create_user(
+                admin_user = await auth_service.create_user(
                     db=db,
                     email=settings.ADMIN_EMAIL,
                     password=settings.ADMIN_PASSWORD,
@@ -145,79 +249,96 @@ async def startup_event():
                 admin_user.can_upload_documents = True
                 admin_user.can_delete_documents = True
                 admin_user.can_access_analytics = True
-                db.commit()
+                await db.commit()
                 logger.info(f"Admin user created: {settings.ADMIN_EMAIL}")
             else:
                 logger.info("Admin user already exists")
-                
-        except Exception as e:
-            logger.error(f"Failed to create admin user: {e}")
-    
-    logger.info("API is ready!")
+    except Exception as e:
+        logger.error(f"Failed to create admin user: {e}")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info(f"Shutting down {settings.APP_NAME}")
+    _log_listener.stop()
+
+# Root endpoints. Both bodies are fixed once settings load, so they are
+# serialized a single time at import; the handlers only copy bytes
+_ROOT_BYTES = orjson.dumps({
+    "message": settings.APP_NAME,
+    "version": _APP_VERSION,
+    "environment": _ENVIRONMENT,
+    "features": [
+        "User authentication & authorization",
+        "Document upload and processing",
+        "Semantic document search",
+        "AI-powered chat responses",
+        "Conversation management",
+        "RAG (Retrieval-Augmented Generation)",
+        "Role-based access control",
+        "API key management",
+        "Audit logging",
+        "Rate limiting"
+    ],
+    "endpoints": {
+        "auth": "/api/auth/login",
+        "register": "/api/auth/register",
+        "docs": "/docs" if settings.DEBUG else "disabled",
+        "chat": "/api/chat/message",
+        "documents": "/api/documents/upload"
+    }
+})
+
+_HEALTH_BYTES = orjson.dumps({
+    "status": "healthy",
+    "version": _APP_VERSION,
+    "environment": _ENVIRONMENT,
+    "database": "connected",
+    "vector_store": "connected",
+    "llm": _LLM_STATUS,
+    "auth": "enabled",
+    "rate_limiting": _RATE_LIMIT_STATUS
+})
 
-# Root endpoints
 @app.get("/")
 async def root():
-    return {
-        "message": f"{settings.APP_NAME}",
-        "version": settings.APP_VERSION,
-        "environment": settings.ENVIRONMENT,
-        "features": [
-            "User authentication & authorization",
-            "Document upload and processing",
-            "Semantic document search",
-            "AI-powered chat responses",
-            "Conversation management",
-            "RAG (Retrieval-Augmented Generation)",
-            "Role-based access control",
-            "API key management",
-            "Audit logging",
-            "Rate limiting"
-        ],
-        "endpoints": {
-            "auth": "/api/auth/login",
-            "register": "/api/auth/register",
-            "docs": "/docs" if settings.DEBUG else "disabled",
-            "chat": "/api/chat/message",
-            "documents": "/api/documents/upload"
-        }
-    }
+    return Response(content=_ROOT_BYTES, media_type="application/json")
 
 @app.get("/health")
 async def health_check():
-    return {
-        "status": "healthy",
-        "version": settings.APP_VERSION,
-        "environment": settings.ENVIRONMENT,
-        "database": "connected",
-        "vector_store": "connected",
-        "llm": "configured" if settings.OPENAI_API_KEY else "not_configured",
-        "auth": "enabled",
-        "rate_limiting": "enabled" if settings.RATE_LIMIT_ENABLED else "disabled"
-    }
+    return Response(content=_HEALTH_BYTES, media_type="application/json")
 
 # System info endpoint (admin only)
 @app.get("/system/info")
 async def system_info(
     admin_user: User = Depends(require_role("admin")),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get system information (admin only)"""
     
-    # Get database stats
-    total_users = db.query(User).count()
-    active_users = db.query(User).filter(User.is_active == True).count()
-    
     from app.models.conversations import Conversation, Message
     from app.models.documents import Document
     
-    total_conversations = db.query(Conversation).count()
-    total_messages = db.query(Message).count()
-    total_documents = db.query(Document).count()
+    # All five counts as scalar subqueries in one statement: one
+    # round-trip instead of five sequential ones
+    row = (await db.execute(
+        select(
+            select(func.count()).select_from(User)
+            .scalar_subquery().label("total_users"),
+            select(func.count()).select_from(User).where(User.is_active == True)
+            .scalar_subquery().label("active_users"),
+            select(func.count()).select_from(Conversation)
+            .scalar_subquery().label("total_conversations"),
+            select(func.count()).select_from(Message)
+            .scalar_subquery().label("total_messages"),
+            select(func.count()).select_from(Document)
+            .scalar_subquery().label("total_documents")
+        )
+    )).one()
+    total_users = row.total_users
+    active_users = row.active_users
+    total_conversations = row.total_conversations
+    total_messages = row.total_messages
+    total_documents = row.total_documents
     
     return {
         "system": {
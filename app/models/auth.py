@@ -1,6 +1,11 @@
 # app/models/auth.py - REMOVE the User class definition
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Index, JSON, LargeBinary, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
+
+# JSONB on PostgreSQL (indexable, server-side path queries), plain JSON
+# elsewhere (SQLite dev database)
+PortableJSON = JSON().with_variant(JSONB(), "postgresql")
 from sqlalchemy.sql import func
 from app.core.database import Base
 
@@ -18,9 +23,14 @@ class APIKey(Base):
     key_name = Column(String(100), nullable=False)
     key_hash = Column(String(255), nullable=False, unique=True, index=True)
     key_prefix = Column(String(10), nullable=False)  # First few chars for identification
+    # Binary lookup columns: a 16-byte indexed prefix seeks straight to the
+    # candidate row, then the peppered HMAC confirms the full key. Nullable
+    # so keys issued before these columns still validate via key_hash.
+    key_prefix_bin = Column(LargeBinary(16), index=True)
+    key_hmac = Column(LargeBinary(32))
     
     # Permissions and limits
-    scopes = Column(Text)  # JSON array of allowed endpoints/actions
+    scopes = Column(PortableJSON)  # JSON array of allowed endpoints/actions
     rate_limit_per_hour = Column(Integer, default=1000)
     
     # Status
@@ -35,6 +45,14 @@ class APIKey(Base):
     # Relationship - references User table from users.py
     user = relationship("User", back_populates="api_keys")
 
+# Partial index backing the active-key count in generate_api_key
+Index(
+    "ix_api_keys_user_id_active",
+    APIKey.user_id,
+    postgresql_where=text("is_active"),
+    sqlite_where=text("is_active")
+)
+
 class AuditLog(Base):
     """Security and activity audit logging"""
     __tablename__ = "audit_logs"
@@ -59,12 +77,30 @@ class AuditLog(Base):
     error_message = Column(Text)
     
     # Metadata
-    additional_data = Column(Text)  # JSON for extra context
+    additional_data = Column(PortableJSON)  # Extra event context
     timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     
     # Relationship - references User table from users.py
     user = relationship("User", back_populates="audit_logs")
 
+# Covers the audit-log listing: newest first, filtered by type and/or user
+Index(
+    "ix_audit_logs_timestamp_event_user",
+    AuditLog.timestamp.desc(),
+    AuditLog.event_type,
+    AuditLog.user_id
+)
+
+# Per-user audit trail lookups
+Index("ix_audit_logs_user_id_timestamp", AuditLog.user_id, AuditLog.timestamp)
+
+# Server-side filtering on event metadata (PostgreSQL only)
+Index(
+    "ix_audit_logs_additional_data_gin",
+    AuditLog.additional_data,
+    postgresql_using="gin"
+)
+
 class PasswordResetToken(Base):
     """Password reset tokens"""
     __tablename__ = "password_reset_tokens"
@@ -79,6 +115,16 @@ class PasswordResetToken(Base):
     expires_at = Column(DateTime(timezone=True), nullable=False)
     used_at = Column(DateTime(timezone=True))
 
+# reset_password can only match unused tokens, so indexing just those
+# keeps the seek O(log live_tokens) no matter how long the token log
+# grows; the cleanup sweeper in auth_service bounds the log itself
+Index(
+    "ix_password_reset_tokens_token_live",
+    PasswordResetToken.token,
+    postgresql_where=text("NOT is_used"),
+    sqlite_where=text("NOT is_used")
+)
+
 class RateLimitLog(Base):
     """Track API rate limiting"""
     __tablename__ = "rate_limit_logs"
@@ -96,4 +142,11 @@ class RateLimitLog(Base):
     
     # Status
     is_blocked = Column(Boolean, default=False)
-    block_until = Column(DateTime(timezone=True))
\ No newline at end of file
+    block_until = Column(DateTime(timezone=True))
+
+# Window scans for a given identifier
+Index(
+    "ix_rate_limit_logs_identifier_window_start",
+    RateLimitLog.identifier,
+    RateLimitLog.window_start
+)
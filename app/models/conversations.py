@@ -1,5 +1,8 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Float, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Float, JSON, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
+
+PortableJSON = JSON().with_variant(JSONB(), "postgresql")
 from sqlalchemy.sql import func
 from app.core.database import Base
 
@@ -18,9 +21,24 @@ class Conversation(Base):
     
     # Relationships
     user = relationship("User", back_populates="conversations")
-    messages = relationship("Message", back_populates="conversation")
+    messages = relationship("Message", back_populates="conversation", order_by="Message.timestamp")
     documents = relationship("ConversationDocument", back_populates="conversation")
 
+# Orders a user's conversations by recency without a sort-on-read
+Index(
+    "ix_conversations_user_id_last_message_at",
+    Conversation.user_id,
+    Conversation.last_message_at
+)
+
+# Partial index for listing a user's active conversations
+Index(
+    "ix_conversations_user_id_active",
+    Conversation.user_id,
+    postgresql_where=text("is_active"),
+    sqlite_where=text("is_active")
+)
+
 class Message(Base):
     __tablename__ = "messages"
     
@@ -33,13 +51,20 @@ class Message(Base):
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     
     # Bot response metadata (only for bot messages)
-    source_documents = Column(JSON)  # List of document IDs used
+    source_documents = Column(PortableJSON)  # List of document IDs used
     confidence_score = Column(Float)  # 0-1 confidence rating
     user_feedback = Column(Integer)  # 1 (thumbs up), -1 (thumbs down), null (no feedback)
     
     # Relationship
     conversation = relationship("Conversation", back_populates="messages")
 
+# Chat history loads are WHERE conversation_id ORDER BY timestamp
+Index(
+    "ix_messages_conversation_id_timestamp",
+    Message.conversation_id,
+    Message.timestamp
+)
+
 class ConversationDocument(Base):
     __tablename__ = "conversation_documents"
     
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Float, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -18,6 +18,9 @@ class Document(Base):
     # File metadata  
     file_size = Column(Integer)  # in bytes
     original_filename = Column(String(255))
+    # SHA-256 of the file contents, computed while the upload streams to
+    # disk; lets re-uploads short-circuit the whole pipeline
+    content_hash = Column(String(64), index=True)
     
     # Timestamps
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -33,6 +36,15 @@ class Document(Base):
     chunks = relationship("DocumentChunk", back_populates="document")
     conversations = relationship("ConversationDocument", back_populates="document")
 
+# Partial index for the filtered document listing
+Index(
+    "ix_documents_department_content_type_active",
+    Document.department,
+    Document.content_type,
+    postgresql_where=text("is_active"),
+    sqlite_where=text("is_active")
+)
+
 class DocumentChunk(Base):
     __tablename__ = "document_chunks"
     
@@ -49,4 +61,13 @@ class DocumentChunk(Base):
     vector_id = Column(String(100))  # ChromaDB ID
     
     # Relationship back to document
-    document = relationship("Document", back_populates="chunks")
\ No newline at end of file
+    document = relationship("Document", back_populates="chunks")
+
+# One chunk row per (document, position); also what the bulk chunk
+# insert relies on to stay idempotent
+Index(
+    "ix_document_chunks_document_id_chunk_index",
+    DocumentChunk.document_id,
+    DocumentChunk.chunk_index,
+    unique=True
+)
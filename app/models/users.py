@@ -1,5 +1,5 @@
 # app/models/users.py - FINAL UNIFIED VERSION
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index, Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -37,4 +37,9 @@ class User(Base):
     # Relationships
     conversations = relationship("Conversation", back_populates="user")
     api_keys = relationship("APIKey", back_populates="user")
-    audit_logs = relationship("AuditLog", back_populates="user")
\ No newline at end of file
+    audit_logs = relationship("AuditLog", back_populates="user")
+
+# Case-insensitive login lookups: email filters compare on lower(email),
+# which this expression index serves with a B-tree seek; unique so two
+# casings of one address cannot both register
+Index("ix_users_email_lower", func.lower(User.email), unique=True)
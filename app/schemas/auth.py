@@ -135,5 +135,8 @@ class RateLimitExceeded(BaseModel):
     retry_after: int
     message: str
 
-# Resolve forward references
-Token.model_rebuild()
\ No newline at end of file
+# Resolve forward references and any deferred core-schema builds at
+# import so the first request doesn't pay for them
+for _model in list(vars().values()):
+    if isinstance(_model, type) and issubclass(_model, BaseModel) and _model is not BaseModel:
+        _model.model_rebuild()
\ No newline at end of file
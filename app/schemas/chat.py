@@ -1,15 +1,27 @@
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, StringConstraints
+from typing import Annotated, List, Optional, Dict, Any
 from datetime import datetime
 
+# Shape-only email check that runs in pydantic-core; full EmailStr
+# validation (~50-100us via email-validator) stays on the auth schemas,
+# where registration correctness matters more than per-message latency
+EmailField = Annotated[str, StringConstraints(pattern=r"^[^@\s]+@[^@\s]+\.[^@\s]+$", max_length=254)]
+
 # Request schemas
 class ChatMessageRequest(BaseModel):
     message: str = Field(..., min_length=1, max_length=2000)
-    user_email: EmailStr  # ✅ replaced regex with EmailStr
+    user_email: EmailField
+    session_id: Optional[str] = None
+
+class ChatBatchRequest(BaseModel):
+    messages: List[Annotated[str, StringConstraints(min_length=1, max_length=2000)]] = Field(
+        ..., min_length=1, max_length=20
+    )
+    user_email: EmailField
     session_id: Optional[str] = None
 
 class ChatHistoryRequest(BaseModel):
-    user_email: EmailStr  # ✅ replaced regex with EmailStr
+    user_email: EmailField
     session_id: str
 
 class MessageFeedbackRequest(BaseModel):
@@ -68,3 +80,9 @@ class ChatAnalytics(BaseModel):
     average_confidence_score: Optional[float]
     most_active_departments: List[Dict[str, Any]]
     popular_topics: List[str]
+
+# Resolve any deferred core-schema builds at import so the first request
+# doesn't pay for them
+for _model in list(vars().values()):
+    if isinstance(_model, type) and issubclass(_model, BaseModel) and _model is not BaseModel:
+        _model.model_rebuild()
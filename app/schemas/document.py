@@ -48,3 +48,9 @@ class DocumentUploadResponse(BaseModel):
     title: str
     message: str
     chunks_created: int
+
+# Resolve any deferred core-schema builds at import so the first request
+# doesn't pay for them
+for _model in list(vars().values()):
+    if isinstance(_model, type) and issubclass(_model, BaseModel) and _model is not BaseModel:
+        _model.model_rebuild()
@@ -1,11 +1,18 @@
 import os
+import asyncio
+import hmac
 import secrets
 import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 import jwt
+from cachetools import TTLCache
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 
 from app.models.auth import APIKey, AuditLog, PasswordResetToken
@@ -14,32 +21,164 @@ from app.core.config import get_settings
 
 settings = get_settings()
 
+# How long a successful bcrypt verification may be reused for identical
+# credentials. Short on purpose: just long enough to absorb login bursts.
+LOGIN_CACHE_TTL_SECONDS = 10
+MISSING_USER_CACHE_TTL_SECONDS = 10
+
+# Audit rows flush in the background once this many accumulate or this
+# much time passes, whichever comes first
+AUDIT_FLUSH_BATCH_SIZE = 200
+AUDIT_FLUSH_INTERVAL_SECONDS = 0.5
+
+# Maximum number of active API keys per user
+MAX_ACTIVE_API_KEYS = 5
+
+# Expired-credential sweep: how often it runs and how long used/expired
+# reset tokens are kept before deletion (a day covers support lookups)
+TOKEN_CLEANUP_INTERVAL_SECONDS = 3600
+RESET_TOKEN_RETENTION = timedelta(days=1)
+
+# Permission name -> predicate; one dict built at import instead of a
+# fresh map (evaluating every branch) per check
+_PERMISSION_CHECKS = {
+    "upload_documents": lambda user: user.can_upload_documents,
+    "delete_documents": lambda user: user.can_delete_documents,
+    "access_analytics": lambda user: user.can_access_analytics,
+    "admin": lambda user: user.role == "admin",
+    "manager": lambda user: user.role in ("manager", "admin")
+}
+
+@lru_cache(maxsize=1024)
+def _permissions_entry(can_upload: bool, can_delete: bool, can_analytics: bool, role: str) -> Dict[str, bool]:
+    """Permission block for a summary; there are only a handful of
+    distinct flag/role combinations, so each is built once"""
+    return {
+        "upload_documents": can_upload,
+        "delete_documents": can_delete,
+        "access_analytics": can_analytics,
+        "is_admin": role == "admin",
+        "is_manager": role in ("manager", "admin")
+    }
+
+def _build_pwd_context() -> CryptContext:
+    """Password hashing context: argon2id for new hashes (~50ms, far cheaper
+    per-core than bcrypt), with bcrypt kept so existing $2b$ hashes still
+    verify. Legacy hashes are upgraded to argon2 on successful login.
+    Costs come from settings so deployments can retune as hardware moves."""
+    return CryptContext(
+        schemes=["argon2", "bcrypt"],
+        deprecated=["bcrypt"],
+        argon2__time_cost=settings.PASSWORD_HASH_TIME_COST,
+        argon2__memory_cost=settings.PASSWORD_HASH_MEMORY_COST,
+        argon2__parallelism=1
+    )
+
+# Worker-side context for the hashing process pool, built once per process
+_worker_pwd_context: Optional[CryptContext] = None
+
+def _pool_hash(password: str) -> str:
+    global _worker_pwd_context
+    if _worker_pwd_context is None:
+        _worker_pwd_context = _build_pwd_context()
+    return _worker_pwd_context.hash(password)
+
+def _pool_verify_and_update(password: str, hashed: str):
+    global _worker_pwd_context
+    if _worker_pwd_context is None:
+        _worker_pwd_context = _build_pwd_context()
+    return _worker_pwd_context.verify_and_update(password, hashed)
+
 class AuthService:
     def __init__(self):
         # Password hashing
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-        
+        self.pwd_context = _build_pwd_context()
+
+        # Process pool so hashing runs off the event loop, created lazily
+        # (after any uvicorn/gunicorn fork) on first use
+        self._hash_pool: Optional[ProcessPoolExecutor] = None
+
         # JWT settings
         self.secret_key = settings.SECRET_KEY
         self.algorithm = settings.ALGORITHM
-        self.access_token_expire_minutes = settings.ACCESS_TOKEN_EXPIRE_MINUTES
-    
+        # Precomputed once; building a timedelta per token is wasted work
+        self.access_token_expire = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+
+        # Short-TTL cache of verified logins: HMAC(email:password) -> (user_id, expiry).
+        # Lets a burst of identical logins skip the ~100ms bcrypt verification.
+        self._login_cache: Dict[str, Tuple[int, float]] = {}
+
+        # Known-missing emails: credential-stuffing probes repeat the same
+        # unknown addresses, so remember misses briefly and skip the DB
+        self._missing_users: TTLCache = TTLCache(
+            maxsize=50_000, ttl=MISSING_USER_CACHE_TTL_SECONDS
+        )
+        # Verified against for unknown users so a probe costs the same
+        # wall time as a wrong password and can't confirm the email
+        self._dummy_hash = self.pwd_context.hash(secrets.token_urlsafe(16))
+
+        # Audit events queue up for a background task to bulk-insert,
+        # keeping the commit off the request path; created lazily so the
+        # task binds to the running event loop
+        self._audit_queue: Optional[asyncio.Queue] = None
+        self._audit_flusher_task: Optional[asyncio.Task] = None
+        self._cleanup_task: Optional[asyncio.Task] = None
+
+    def _login_cache_key(self, email: str, password: str) -> str:
+        """Derive an HMAC cache key so credentials are never stored directly"""
+        return hmac.new(
+            self.secret_key.encode(),
+            f"{email}:{password}".encode(),
+            hashlib.sha256
+        ).hexdigest()
+
+    def invalidate_login_cache(self, user_id: int):
+        """Drop cached logins for a user (call on password change)"""
+        self._login_cache = {
+            key: entry for key, entry in self._login_cache.items()
+            if entry[0] != user_id
+        }
+
     def hash_password(self, password: str) -> str:
         """Hash a password for storing"""
         return self.pwd_context.hash(password)
-    
+
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         """Verify a password against its hash"""
         return self.pwd_context.verify(plain_password, hashed_password)
-    
+
+    def _get_hash_pool(self) -> ProcessPoolExecutor:
+        if self._hash_pool is None:
+            self._hash_pool = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS or os.cpu_count()
+            )
+        return self._hash_pool
+
+    async def hash_password_async(self, password: str) -> str:
+        """Hash a password on the process pool, keeping the event loop free"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_hash_pool(), _pool_hash, password)
+
+    async def verify_password_async(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify a password on the process pool, keeping the event loop free"""
+        valid, _ = await self.verify_and_update_async(plain_password, hashed_password)
+        return valid
+
+    async def verify_and_update_async(self, plain_password: str, hashed_password: str):
+        """Verify on the process pool, returning (valid, new_hash_or_None)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_hash_pool(), _pool_verify_and_update, plain_password, hashed_password
+        )
+
     def create_access_token(self, data: Dict[str, Any]) -> str:
         """Create a JWT access token"""
         to_encode = data.copy()
-        expire = datetime.utcnow() + timedelta(minutes=self.access_token_expire_minutes)
+        expire = datetime.utcnow() + self.access_token_expire
         to_encode.update({"exp": expire})
-        
+
         return jwt.encode(to_encode, self.secret_key, algorithm=self.algorithm)
-    
+
     def decode_token(self, token: str) -> Dict[str, Any]:
         """Decode and validate a JWT token"""
         try:
@@ -55,29 +194,57 @@ class AuthService:
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token"
             )
-    
-    def authenticate_user(self, db: Session, email: str, password: str) -> Optional[User]:
+
+    async def authenticate_user(self, db: AsyncSession, email: str, password: str) -> Optional[User]:
         """Authenticate a user with email and password"""
-        user = db.query(User).filter(User.email == email).first()
-        
+
+        # Check the short-TTL login cache first to skip bcrypt on repeat logins
+        cache_key = self._login_cache_key(email, password)
+        cached = self._login_cache.get(cache_key)
+        if cached and cached[1] > time.monotonic():
+            result = await db.execute(select(User).where(User.id == cached[0]))
+            user = result.scalar_one_or_none()
+            if user and user.is_active:
+                return user
+            # Stale entry (user deleted/deactivated) - fall through to full check
+            self._login_cache.pop(cache_key, None)
+
+        if email.lower() in self._missing_users:
+            # Constant-time negative: same hashing cost, no DB roundtrip
+            await self.verify_password_async(password, self._dummy_hash)
+            return None
+
+        result = await db.execute(select(User).where(func.lower(User.email) == email.lower()))
+        user = result.scalar_one_or_none()
+
         if not user:
+            self._missing_users[email.lower()] = True
+            await self.verify_password_async(password, self._dummy_hash)
             return None
-        
+
         if not user.is_active:
             return None
-            
-        if not self.verify_password(password, user.hashed_password):
+
+        valid, new_hash = await self.verify_and_update_async(password, user.hashed_password)
+        if not valid:
             return None
-        
+
+        # Transparently upgrade legacy bcrypt hashes to argon2
+        if new_hash:
+            user.hashed_password = new_hash
+
+        # Cache the verified login briefly
+        self._login_cache[cache_key] = (user.id, time.monotonic() + LOGIN_CACHE_TTL_SECONDS)
+
         # Update last login
         user.last_login = datetime.utcnow()
-        db.commit()
-        
+        await db.commit()
+
         return user
-    
-    def create_user(
-        self, 
-        db: Session,
+
+    async def create_user(
+        self,
+        db: AsyncSession,
         email: str,
         password: str,
         full_name: str,
@@ -85,91 +252,147 @@ class AuthService:
         role: str = "employee"
     ) -> User:
         """Create a new user"""
-        
+
         # Check if user already exists
-        if db.query(User).filter(User.email == email).first():
+        result = await db.execute(select(User).where(func.lower(User.email) == email.lower()))
+        if result.scalar_one_or_none():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
-        
+
         # Create user
         user = User(
+            name=full_name,
             email=email,
-            hashed_password=self.hash_password(password),
+            hashed_password=await self.hash_password_async(password),
             full_name=full_name,
             department=department,
             role=role,
             is_active=True,
             is_verified=True  # Auto-verify for now, implement email verification later
         )
-        
+
         db.add(user)
-        db.commit()
-        db.refresh(user)
-        
+        await db.commit()
+        await db.refresh(user)
+
+        # The email is no longer missing: drop any negative-login cache
+        # entry so the user can log in immediately after registering
+        self._missing_users.pop(email.lower(), None)
+
         return user
-    
-    def generate_api_key(self, db: Session, user_id: int, key_name: str) -> Dict[str, str]:
-        """Generate a new API key for a user"""
-        
+
+    async def generate_api_key(self, db: AsyncSession, user_id: int, key_name: str) -> Dict[str, str]:
+        """Generate a new API key for a user, enforcing the per-user limit
+        atomically in the INSERT itself (no SELECT-then-INSERT race)"""
+
         # Generate random key
         key = secrets.token_urlsafe(32)
-        key_hash = hashlib.sha256(key.encode()).hexdigest()
+        key_bytes = key.encode()
+        key_hash = hashlib.sha256(key_bytes).hexdigest()
         key_prefix = key[:8]
-        
-        # Store in database
-        api_key = APIKey(
-            user_id=user_id,
-            key_name=key_name,
-            key_hash=key_hash,
-            key_prefix=key_prefix,
-            expires_at=datetime.utcnow() + timedelta(days=365)  # 1 year expiry
+        key_prefix_bin, key_hmac = self._api_key_lookup_values(key_bytes)
+        expires_at = datetime.utcnow() + timedelta(days=365)  # 1 year expiry
+
+        # Conditional INSERT: only succeeds while the user is under the
+        # active-key limit, so two concurrent requests cannot both slip past
+        active_keys = (
+            select(func.count())
+            .select_from(APIKey)
+            .where(APIKey.user_id == user_id, APIKey.is_active == True)
+            .scalar_subquery()
         )
-        
-        db.add(api_key)
-        db.commit()
-        db.refresh(api_key)
-        
+        stmt = (
+            insert(APIKey)
+            .from_select(
+                ["user_id", "key_name", "key_hash", "key_prefix",
+                 "key_prefix_bin", "key_hmac", "expires_at"],
+                select(
+                    literal(user_id), literal(key_name), literal(key_hash),
+                    literal(key_prefix), literal(key_prefix_bin),
+                    literal(key_hmac), literal(expires_at)
+                ).where(active_keys < MAX_ACTIVE_API_KEYS)
+            )
+            .returning(APIKey.id, APIKey.expires_at)
+        )
+
+        result = await db.execute(stmt)
+        row = result.first()
+        if row is None:
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Maximum number of API keys reached ({MAX_ACTIVE_API_KEYS})"
+            )
+        await db.commit()
+
         return {
             "api_key": f"sk-{key}",
-            "key_id": api_key.id,
-            "expires_at": api_key.expires_at.isoformat()
+            "key_id": row.id,
+            "expires_at": row.expires_at.isoformat()
         }
-    
-    def validate_api_key(self, db: Session, api_key: str) -> Optional[User]:
+
+    def _api_key_lookup_values(self, key_bytes: bytes) -> Tuple[bytes, bytes]:
+        """(16-byte index prefix, peppered HMAC-SHA256) for a raw key"""
+        return (
+            key_bytes[:16],
+            hmac.new(self.secret_key.encode(), key_bytes, hashlib.sha256).digest()
+        )
+
+    async def validate_api_key(self, db: AsyncSession, api_key: str) -> Optional[User]:
         """Validate an API key and return the associated user"""
-        
+
         if not api_key.startswith("sk-"):
             return None
-        
+
         key = api_key[3:]  # Remove 'sk-' prefix
-        key_hash = hashlib.sha256(key.encode()).hexdigest()
-        
-        # Find API key in database
-        api_key_record = db.query(APIKey).filter(
-            APIKey.key_hash == key_hash,
-            APIKey.is_active == True
-        ).first()
-        
+        key_bytes = key.encode()
+        key_prefix_bin, key_hmac = self._api_key_lookup_values(key_bytes)
+
+        # Indexed seek on the binary prefix, then a constant-time compare
+        # of the peppered HMAC confirms the full key without hashing rows
+        result = await db.execute(
+            select(APIKey).where(
+                APIKey.key_prefix_bin == key_prefix_bin,
+                APIKey.is_active == True
+            )
+        )
+        api_key_record = None
+        for candidate in result.scalars():
+            if candidate.key_hmac and hmac.compare_digest(key_hmac, candidate.key_hmac):
+                api_key_record = candidate
+                break
+
+        if api_key_record is None:
+            # Keys issued before the binary columns only carry key_hash
+            result = await db.execute(
+                select(APIKey).where(
+                    APIKey.key_hash == hashlib.sha256(key_bytes).hexdigest(),
+                    APIKey.is_active == True
+                )
+            )
+            api_key_record = result.scalar_one_or_none()
+
         if not api_key_record:
             return None
-        
+
         # Check if expired
         if api_key_record.expires_at and api_key_record.expires_at < datetime.utcnow():
             return None
-        
+
         # Update usage
         api_key_record.last_used = datetime.utcnow()
         api_key_record.usage_count += 1
-        db.commit()
-        
+        await db.commit()
+
         # Return associated user
-        return db.query(User).filter(User.id == api_key_record.user_id).first()
-    
-    def log_audit_event(
+        result = await db.execute(select(User).where(User.id == api_key_record.user_id))
+        return result.scalar_one_or_none()
+
+    async def log_audit_event(
         self,
-        db: Session,
+        db: AsyncSession,
         user_id: Optional[int],
         event_type: str,
         action: str,
@@ -183,106 +406,180 @@ class AuthService:
         error_message: str = None,
         additional_data: Dict = None
     ):
-        """Log an audit event"""
-        
-        audit_log = AuditLog(
-            user_id=user_id,
-            event_type=event_type,
-            resource_type=resource_type,
-            resource_id=resource_id,
-            action=action,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            endpoint=endpoint,
-            http_method=http_method,
-            status=status,
-            error_message=error_message,
-            additional_data=str(additional_data) if additional_data else None
-        )
-        
-        db.add(audit_log)
-        db.commit()
-    
+        """Queue an audit event; a background task batches the inserts.
+
+        The db session is accepted for call-site compatibility but no
+        longer written to - rows land through a background session.
+        """
+        if self._audit_queue is None:
+            self._audit_queue = asyncio.Queue(maxsize=10_000)
+            self._audit_flusher_task = asyncio.get_running_loop().create_task(
+                self._audit_flusher()
+            )
+
+        row = {
+            "user_id": user_id,
+            "event_type": event_type,
+            "resource_type": resource_type,
+            "resource_id": resource_id,
+            "action": action,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "endpoint": endpoint,
+            "http_method": http_method,
+            "status": status,
+            "error_message": error_message,
+            "additional_data": additional_data or None,
+            "timestamp": datetime.utcnow()
+        }
+        try:
+            self._audit_queue.put_nowait(row)
+        except asyncio.QueueFull:
+            # Shedding audit rows beats stalling the request under load
+            pass
+
+    async def _audit_flusher(self):
+        """Drain queued audit events into batched inserts"""
+        from app.core.database import AsyncSessionLocal
+
+        while True:
+            rows = [await self._audit_queue.get()]
+
+            # Briefly let more events accumulate so one commit covers many
+            deadline = time.monotonic() + AUDIT_FLUSH_INTERVAL_SECONDS
+            while len(rows) < AUDIT_FLUSH_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(await asyncio.wait_for(self._audit_queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                async with AsyncSessionLocal() as flush_db:
+                    await flush_db.execute(insert(AuditLog), rows)
+                    await flush_db.commit()
+            except Exception:
+                # Audit logging must never take the service down
+                pass
+
+    def start_cleanup_task(self):
+        """Start the periodic expired-credential sweep (once per process)"""
+        if self._cleanup_task is None:
+            self._cleanup_task = asyncio.get_running_loop().create_task(
+                self._token_cleanup_loop()
+            )
+
+    async def _token_cleanup_loop(self):
+        """Hourly sweep so the reset-token and API-key tables stay small
+
+        Deletes reset tokens a day past expiry and tombstones expired API
+        keys (is_active=False) so they drop out of the partial indexes the
+        hot lookups use. Idempotent, so multiple workers sweeping is fine.
+        """
+        from app.core.database import AsyncSessionLocal
+
+        while True:
+            await asyncio.sleep(TOKEN_CLEANUP_INTERVAL_SECONDS)
+            try:
+                now = datetime.utcnow()
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        delete(PasswordResetToken).where(
+                            PasswordResetToken.expires_at < now - RESET_TOKEN_RETENTION
+                        )
+                    )
+                    await db.execute(
+                        update(APIKey)
+                        .where(APIKey.expires_at < now, APIKey.is_active == True)
+                        .values(is_active=False)
+                    )
+                    await db.commit()
+            except Exception:
+                # Housekeeping must never take the service down
+                pass
+
     def check_user_permissions(self, user: User, required_permission: str) -> bool:
         """Check if user has required permission"""
-        
-        permission_map = {
-            "upload_documents": user.can_upload_documents,
-            "delete_documents": user.can_delete_documents,
-            "access_analytics": user.can_access_analytics,
-            "admin": user.role == "admin",
-            "manager": user.role in ["manager", "admin"]
-        }
-        
-        return permission_map.get(required_permission, False)
-    
-    def create_password_reset_token(self, db: Session, email: str) -> Optional[str]:
+
+        check = _PERMISSION_CHECKS.get(required_permission)
+        return check(user) if check is not None else False
+
+    async def create_password_reset_token(self, db: AsyncSession, email: str) -> Optional[str]:
         """Create a password reset token"""
-        
-        user = db.query(User).filter(User.email == email).first()
+
+        result = await db.execute(select(User).where(func.lower(User.email) == email.lower()))
+        user = result.scalar_one_or_none()
         if not user:
             return None
-        
+
         # Generate token
         token = secrets.token_urlsafe(32)
-        
+
         # Store in database
         reset_token = PasswordResetToken(
             user_id=user.id,
             token=token,
             expires_at=datetime.utcnow() + timedelta(hours=1)  # 1 hour expiry
         )
-        
+
         db.add(reset_token)
-        db.commit()
-        
+        await db.commit()
+
         return token
-    
-    def reset_password(self, db: Session, token: str, new_password: str) -> bool:
+
+    async def reset_password(self, db: AsyncSession, token: str, new_password: str) -> bool:
         """Reset password using token"""
-        
+
         # Find token
-        reset_token = db.query(PasswordResetToken).filter(
-            PasswordResetToken.token == token,
-            PasswordResetToken.is_used == False,
-            PasswordResetToken.expires_at > datetime.utcnow()
-        ).first()
-        
+        result = await db.execute(
+            select(PasswordResetToken).where(
+                PasswordResetToken.token == token,
+                PasswordResetToken.is_used == False,
+                PasswordResetToken.expires_at > datetime.utcnow()
+            )
+        )
+        reset_token = result.scalar_one_or_none()
+
         if not reset_token:
             return False
-        
+
         # Get user
-        user = db.query(User).filter(User.id == reset_token.user_id).first()
+        result = await db.execute(select(User).where(User.id == reset_token.user_id))
+        user = result.scalar_one_or_none()
         if not user:
             return False
-        
+
         # Update password
-        user.hashed_password = self.hash_password(new_password)
+        user.hashed_password = await self.hash_password_async(new_password)
         user.password_changed_at = datetime.utcnow()
-        
+
         # Mark token as used
         reset_token.is_used = True
         reset_token.used_at = datetime.utcnow()
-        
-        db.commit()
-        
+
+        await db.commit()
+
+        # Cached logins for the old password are no longer valid
+        self.invalidate_login_cache(user.id)
+
         return True
-    
+
     def get_user_permissions_summary(self, user: User) -> Dict[str, Any]:
         """Get a summary of user's permissions"""
-        
+
         return {
             "user_id": user.id,
             "email": user.email,
             "role": user.role,
             "department": user.department,
-            "permissions": {
-                "upload_documents": user.can_upload_documents,
-                "delete_documents": user.can_delete_documents,
-                "access_analytics": user.can_access_analytics,
-                "is_admin": user.role == "admin",
-                "is_manager": user.role in ["manager", "admin"]
-            },
+            "permissions": _permissions_entry(
+                user.can_upload_documents,
+                user.can_delete_documents,
+                user.can_access_analytics,
+                user.role
+            ),
             "account_status": {
                 "is_active": user.is_active,
                 "is_verified": user.is_verified,
@@ -292,4 +589,4 @@ class AuthService:
         }
 
 # Global instance
-auth_service = AuthService()
\ No newline at end of file
+auth_service = AuthService()
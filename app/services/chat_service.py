@@ -1,91 +1,42 @@
+import asyncio
 import os
-from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+import orjson
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 from datetime import datetime
-from sqlalchemy.orm import Session
-from typing import Any, List
-from pydantic import Field
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferWindowMemory
-from langchain.schema import BaseRetriever, Document as LangChainDocument
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
+from openai import AsyncOpenAI
 
+from app.core.database import AsyncSessionLocal
 from app.models.conversations import Conversation, Message
 from app.models.users import User
 from app.services.embedding_service import embedding_service
 from app.services.vector_service import vector_service
 
-class CustomDocumentRetriever(BaseRetriever):
-    """Custom retriever that uses ChromaDB vector service"""
-
-    vector_service: Any = Field(...)
-    embedding_service: Any = Field(...)
-    top_k: int = Field(default=4)
-
-    def _get_relevant_documents(self, query: str) -> List[LangChainDocument]:
-        """Retrieve relevant documents for the query"""
-        # Generate embedding for query
-        query_embedding = self.embedding_service.generate_embedding(query)
-
-        # Search vector database
-        results = self.vector_service.search_similar_chunks(
-            query_embedding=query_embedding,
-            n_results=self.top_k
-        )
+def _sse_event(payload: Dict) -> str:
+    """Render one Server-Sent Events frame"""
+    return "data: " + orjson.dumps(payload).decode() + "\n\n"
 
-        # Convert to LangChain Document format
-        documents = []
-        for i, (content, distance, metadata) in enumerate(zip(
-            results["documents"],
-            results["distances"],
-            results["metadatas"]
-        )):
-            doc = LangChainDocument(
-                page_content=content,
-                metadata={
-                    "source": metadata.get("title", "Unknown Document"),
-                    "department": metadata.get("department", ""),
-                    "content_type": metadata.get("content_type", ""),
-                    "document_id": metadata.get("document_id"),
-                    "chunk_index": metadata.get("chunk_index", i),
-                    "raw_distance": distance,
-                    "relevance_score": 1 - distance  # adjust if cosine sim is used
-                }
-            )
-            documents.append(doc)
+@dataclass(slots=True)
+class _SourceDoc:
+    """Transient per-chunk source info built for every chat reply;
+    slotted so 5-20 instances per reply stay cheap to allocate"""
+    source: str
+    department: str
+    content_type: str
+    document_id: Optional[int]
+    relevance_score: float
+    chunk_content: str
 
-        return documents
-    
 class ChatService:
-    def __init__(self):
-        # Initialize OpenAI
-        self.llm = ChatOpenAI(
-            model_name="gpt-3.5-turbo",
-            temperature=0.1,  # Low temperature for consistent, factual responses
-            openai_api_key=os.getenv("OPENAI_API_KEY")
-        )
-        
-        # Create custom retriever
-        self.retriever = CustomDocumentRetriever(
-                vector_service=vector_service,
-                embedding_service=embedding_service,
-                top_k=4
-            )
-
-        
-        # Create conversation memory
-        self.memory = ConversationBufferWindowMemory(
-            k=5,  # Remember last 5 exchanges
-            memory_key="chat_history",
-            return_messages=True,
-            output_key="answer"
-        )
-        
-        # Custom prompt template for company chatbot
-        self.prompt_template = PromptTemplate(
-            input_variables=["context", "question", "chat_history"],
-            template="""You are a helpful AI assistant for company employees. Use the provided context from company documents to answer questions accurately and helpfully.
+    # Rendered per request with str.format; the chain/template machinery
+    # this replaces re-parsed the template on every call
+    PROMPT_TEMPLATE = """You are a helpful AI assistant for company employees. Use the provided context from company documents to answer questions accurately and helpfully.
 
 Context from company documents:
 {context}
@@ -103,27 +54,60 @@ Instructions:
 Question: {question}
 
 Answer:"""
+
+    def __init__(self):
+        # Async OpenAI client: non-blocking calls on a shared connection
+        # pool, replacing the synchronous ConversationalRetrievalChain
+        # that serialized query rewrite, embedding, search and LLM call
+        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.model = "gpt-3.5-turbo"
+        self.temperature = 0.1  # Low temperature for consistent, factual responses
+        self.top_k = 4
+        self.history_window = 10  # messages carried into the prompt
+
+    def _retrieve(self, query: str) -> List[_SourceDoc]:
+        """Embed the query and fetch the top matching chunks (blocking;
+        run on a worker thread)"""
+        query_embedding = embedding_service.generate_query_embedding(query)
+        results = vector_service.search_similar_chunks(
+            query_embedding=query_embedding,
+            n_results=self.top_k
         )
-        
-        # Create the conversational retrieval chain
-        self.chain = ConversationalRetrievalChain.from_llm(
-            llm=self.llm,
-            retriever=self.retriever,
-            memory=self.memory,
-            return_source_documents=True,
-            combine_docs_chain_kwargs={"prompt": self.prompt_template}
-        )
-    
-    def get_or_create_conversation(
-        self, 
-        db: Session, 
-        user_email: str, 
+
+        # One vectorized pass for distance -> relevance; stays flat as
+        # top_k grows (adjust if cosine sim is used)
+        relevance_scores = (
+            1.0 - np.asarray(results["distances"], dtype=np.float64)
+        ).tolist()
+
+        return [
+            _SourceDoc(
+                source=metadata.get("title", "Unknown Document"),
+                department=metadata.get("department", ""),
+                content_type=metadata.get("content_type", ""),
+                document_id=metadata.get("document_id"),
+                relevance_score=relevance,
+                chunk_content=content
+            )
+            for content, relevance, metadata in zip(
+                results["documents"],
+                relevance_scores,
+                results["metadatas"]
+            )
+        ]
+
+
+    async def get_or_create_conversation(
+        self,
+        db: AsyncSession,
+        user_email: str,
         session_id: Optional[str] = None
     ) -> Tuple[Conversation, User]:
         """Get existing conversation or create new one"""
-        
+
         # Get or create user
-        user = db.query(User).filter(User.email == user_email).first()
+        result = await db.execute(select(User).where(func.lower(User.email) == user_email.lower()))
+        user = result.scalar_one_or_none()
         if not user:
             user = User(
                 name=user_email.split("@")[0],  # Use email prefix as name
@@ -131,18 +115,21 @@ Answer:"""
                 role="employee"
             )
             db.add(user)
-            db.commit()
-            db.refresh(user)
-        
+            await db.commit()
+            await db.refresh(user)
+
         # Get or create conversation
         conversation = None
         if session_id:
-            conversation = db.query(Conversation).filter(
-                Conversation.session_id == session_id,
-                Conversation.user_id == user.id,
-                Conversation.is_active == True
-            ).first()
-        
+            result = await db.execute(
+                select(Conversation).where(
+                    Conversation.session_id == session_id,
+                    Conversation.user_id == user.id,
+                    Conversation.is_active == True
+                )
+            )
+            conversation = result.scalar_one_or_none()
+
         if not conversation:
             # Create new conversation
             import uuid
@@ -153,22 +140,22 @@ Answer:"""
                 is_active=True
             )
             db.add(conversation)
-            db.commit()
-            db.refresh(conversation)
-        
+            await db.commit()
+            await db.refresh(conversation)
+
         return conversation, user
-    
-    def save_message(
-        self, 
-        db: Session, 
-        conversation: Conversation, 
-        content: str, 
+
+    async def save_message(
+        self,
+        db: AsyncSession,
+        conversation: Conversation,
+        content: str,
         is_user_message: bool,
         source_documents: Optional[List[Dict]] = None,
         confidence_score: Optional[float] = None
     ) -> Message:
         """Save a message to the database"""
-        
+
         message = Message(
             conversation_id=conversation.id,
             content=content,
@@ -176,107 +163,122 @@ Answer:"""
             source_documents=source_documents,
             confidence_score=confidence_score
         )
-        
+
         db.add(message)
-        
+
         # Update conversation timestamp
         conversation.last_message_at = datetime.utcnow()
-        
-        db.commit()
-        db.refresh(message)
-        
+
+        await db.commit()
+        await db.refresh(message)
+
         return message
-    
-    def load_conversation_history(self, db: Session, conversation: Conversation):
-        """Load previous messages into memory"""
-        
-        # Clear existing memory
-        self.memory.clear()
-        
-        # Get recent messages (last 10 messages or 5 exchanges)
-        messages = db.query(Message).filter(
-            Message.conversation_id == conversation.id
-        ).order_by(Message.timestamp).limit(10).all()
-        
-        # Add messages to memory in chronological order
-        for message in messages:
-            if message.is_user_message:
-                self.memory.chat_memory.add_user_message(message.content)
-            else:
-                self.memory.chat_memory.add_ai_message(message.content)
-    
-    def generate_response(
-        self, 
-        db: Session,
+
+    async def load_conversation_history(self, db: AsyncSession, conversation: Conversation) -> str:
+        """Render the most recent messages as prompt text, oldest first.
+
+        Built per request from the DB: the shared LangChain memory this
+        replaces was mutated by every request on the module-global
+        service, so interleaved users could leak history into each
+        other's prompts.
+        """
+        result = await db.execute(
+            select(Message).where(
+                Message.conversation_id == conversation.id
+            ).order_by(Message.timestamp.desc()).limit(self.history_window)
+        )
+        messages = result.scalars().all()
+
+        return "\n".join(
+            ("User: " if message.is_user_message else "AI: ") + message.content
+            for message in reversed(messages)
+        )
+
+    async def generate_response(
+        self,
+        db: AsyncSession,
         user_email: str,
         user_message: str,
         session_id: Optional[str] = None
     ) -> Dict:
         """Generate AI response to user message"""
-        
+
         try:
             # Get or create conversation
-            conversation, user = self.get_or_create_conversation(
+            conversation, user = await self.get_or_create_conversation(
                 db, user_email, session_id
             )
-            
+
+            # Retrieval (query embedding + vector search) is blocking
+            # I/O with no DB involvement, so it runs on a worker thread
+            # while this session loads history and saves the user message
+            retrieval_task = asyncio.create_task(
+                asyncio.to_thread(self._retrieve, user_message)
+            )
+
             # Load conversation history
-            self.load_conversation_history(db, conversation)
-            
+            chat_history = await self.load_conversation_history(db, conversation)
+
             # Save user message
-            user_msg = self.save_message(
+            user_msg = await self.save_message(
                 db, conversation, user_message, is_user_message=True
             )
-            
+
+            source_doc_info = await retrieval_task
+
             # Generate AI response
-            result = self.chain({"question": user_message})
-            
-            ai_response = result["answer"]
-            source_docs = result["source_documents"]
-            
-            # Process source documents for storage
-            source_doc_info = []
-            for doc in source_docs:
-                source_doc_info.append({
-                    "source": doc.metadata.get("source", "Unknown"),
-                    "department": doc.metadata.get("department", ""),
-                    "content_type": doc.metadata.get("content_type", ""),
-                    "document_id": doc.metadata.get("document_id"),
-                    "relevance_score": doc.metadata.get("relevance_score", 0),
-                    "chunk_content": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content
-                })
-            
+            prompt = self.PROMPT_TEMPLATE.format(
+                context="\n\n".join(doc.chunk_content for doc in source_doc_info),
+                chat_history=chat_history,
+                question=user_message
+            )
+            completion = await self.client.chat.completions.create(
+                model=self.model,
+                temperature=self.temperature,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            ai_response = completion.choices[0].message.content
+
             # Calculate confidence score based on relevance of sources
             confidence_score = None
             if source_doc_info:
-                avg_relevance = sum(doc.get("relevance_score", 0) for doc in source_doc_info) / len(source_doc_info)
+                avg_relevance = sum(doc.relevance_score for doc in source_doc_info) / len(source_doc_info)
                 confidence_score = min(avg_relevance, 1.0)  # Cap at 1.0
-            
+
+            # Plain dicts at the storage/response boundary, with chunk
+            # previews truncated (full text only feeds the prompt)
+            source_payload = []
+            for doc in source_doc_info:
+                entry = asdict(doc)
+                if len(entry["chunk_content"]) > 200:
+                    entry["chunk_content"] = entry["chunk_content"][:200] + "..."
+                source_payload.append(entry)
+
             # Save AI response
-            ai_msg = self.save_message(
-                db, 
-                conversation, 
-                ai_response, 
+            ai_msg = await self.save_message(
+                db,
+                conversation,
+                ai_response,
                 is_user_message=False,
-                source_documents=source_doc_info,
+                source_documents=source_payload,
                 confidence_score=confidence_score
             )
-            
+
             # Update conversation title if it's the first exchange
             if conversation.title == "New Chat" and len(user_message) > 10:
                 # Generate a title from the first user message
                 conversation.title = user_message[:50] + ("..." if len(user_message) > 50 else "")
-                db.commit()
-            
+                await db.commit()
+
             return {
                 "response": ai_response,
                 "session_id": conversation.session_id,
                 "message_id": ai_msg.id,
-                "sources": source_doc_info,
+                "sources": source_payload,
                 "confidence_score": confidence_score,
                 "conversation_title": conversation.title
             }
-            
+
         except Exception as e:
             # Handle errors gracefully
             return {
@@ -285,35 +287,157 @@ Answer:"""
                 "message_id": None,
                 "sources": [],
                 "confidence_score": None,
+                "conversation_title": "New Chat",
                 "error": str(e)
             }
-    
-    def get_conversation_history(
-        self, 
-        db: Session, 
-        user_email: str, 
+
+    async def stream_response(
+        self,
+        db: AsyncSession,
+        user_email: str,
+        user_message: str,
+        session_id: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Stream the reply as SSE frames: token events as they arrive,
+        then one final metadata event.
+
+        Time-to-first-byte becomes the LLM's first-token latency instead
+        of the full completion. Whatever arrived is persisted even if the
+        client disconnects mid-stream.
+        """
+        try:
+            conversation, user = await self.get_or_create_conversation(
+                db, user_email, session_id
+            )
+
+            retrieval_task = asyncio.create_task(
+                asyncio.to_thread(self._retrieve, user_message)
+            )
+            chat_history = await self.load_conversation_history(db, conversation)
+            await self.save_message(
+                db, conversation, user_message, is_user_message=True
+            )
+            source_doc_info = await retrieval_task
+        except Exception as e:
+            yield _sse_event({"error": str(e)})
+            return
+
+        conversation_id = conversation.id
+        out_session_id = conversation.session_id
+
+        confidence_score = None
+        if source_doc_info:
+            avg_relevance = sum(doc.relevance_score for doc in source_doc_info) / len(source_doc_info)
+            confidence_score = min(avg_relevance, 1.0)
+
+        source_payload = []
+        for doc in source_doc_info:
+            entry = asdict(doc)
+            if len(entry["chunk_content"]) > 200:
+                entry["chunk_content"] = entry["chunk_content"][:200] + "..."
+            source_payload.append(entry)
+
+        prompt = self.PROMPT_TEMPLATE.format(
+            context="\n\n".join(doc.chunk_content for doc in source_doc_info),
+            chat_history=chat_history,
+            question=user_message
+        )
+
+        parts: List[str] = []
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                temperature=self.temperature,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True
+            )
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield _sse_event({"token": delta})
+
+            yield _sse_event({
+                "done": True,
+                "session_id": out_session_id,
+                "sources": source_payload,
+                "confidence_score": confidence_score
+            })
+        except Exception as e:
+            yield _sse_event({"error": str(e)})
+        finally:
+            # No awaits here: a disconnect closes this generator and an
+            # await inside finally would be illegal then. The save runs
+            # on its own task and session so partials still persist.
+            if parts:
+                asyncio.create_task(self._persist_streamed_message(
+                    conversation_id,
+                    "".join(parts),
+                    source_payload,
+                    confidence_score,
+                    user_message
+                ))
+
+    async def _persist_streamed_message(
+        self,
+        conversation_id: int,
+        content: str,
+        source_payload: List[Dict],
+        confidence_score: Optional[float],
+        user_message: str
+    ):
+        """Save a streamed AI reply after its response session is gone"""
+        try:
+            async with AsyncSessionLocal() as db:
+                conversation = await db.get(Conversation, conversation_id)
+                if conversation is None:
+                    return
+
+                db.add(Message(
+                    conversation_id=conversation_id,
+                    content=content,
+                    is_user_message=False,
+                    source_documents=source_payload,
+                    confidence_score=confidence_score
+                ))
+                conversation.last_message_at = datetime.utcnow()
+                if conversation.title == "New Chat" and len(user_message) > 10:
+                    conversation.title = user_message[:50] + ("..." if len(user_message) > 50 else "")
+                await db.commit()
+        except Exception:
+            # Losing one transcript row beats crashing the flusher task
+            pass
+
+    async def get_conversation_history(
+        self,
+        db: AsyncSession,
+        user_email: str,
         session_id: str
     ) -> Dict:
         """Get conversation history"""
-        
+
         # Find user and conversation
-        user = db.query(User).filter(User.email == user_email).first()
+        result = await db.execute(select(User).where(func.lower(User.email) == user_email.lower()))
+        user = result.scalar_one_or_none()
         if not user:
             return {"error": "User not found"}
-        
-        conversation = db.query(Conversation).filter(
-            Conversation.session_id == session_id,
-            Conversation.user_id == user.id
-        ).first()
-        
+
+        # Eager-load the message history with the conversation; under
+        # AsyncSession a lazy conversation.messages access would fail, and
+        # selectinload batches the history fetch with no N+1
+        result = await db.execute(
+            select(Conversation).where(
+                Conversation.session_id == session_id,
+                Conversation.user_id == user.id
+            ).options(selectinload(Conversation.messages))
+        )
+        conversation = result.scalar_one_or_none()
+
         if not conversation:
             return {"error": "Conversation not found"}
-        
-        # Get messages
-        messages = db.query(Message).filter(
-            Message.conversation_id == conversation.id
-        ).order_by(Message.timestamp).all()
-        
+
+        messages = conversation.messages
+
         # Format messages
         formatted_messages = []
         for msg in messages:
@@ -325,7 +449,7 @@ Answer:"""
                 "sources": msg.source_documents,
                 "confidence_score": msg.confidence_score
             })
-        
+
         return {
             "session_id": conversation.session_id,
             "title": conversation.title,
@@ -333,35 +457,35 @@ Answer:"""
             "started_at": conversation.started_at.isoformat(),
             "last_message_at": conversation.last_message_at.isoformat() if conversation.last_message_at else None
         }
-    
-    def list_user_conversations(self, db: Session, user_email: str) -> List[Dict]:
+
+    async def list_user_conversations(self, db: AsyncSession, user_email: str) -> List[Dict]:
         """Get list of user's conversations"""
-        
-        user = db.query(User).filter(User.email == user_email).first()
-        if not user:
-            return []
-        
-        conversations = db.query(Conversation).filter(
-            Conversation.user_id == user.id,
-            Conversation.is_active == True
-        ).order_by(Conversation.last_message_at.desc()).all()
-        
-        result = []
-        for conv in conversations:
-            # Get message count
-            msg_count = db.query(Message).filter(
-                Message.conversation_id == conv.id
-            ).count()
-            
-            result.append({
+
+        # One statement for everything: the user lookup folds into a join
+        # and the per-conversation COUNT(*) loop becomes a GROUP BY, so a
+        # user with K conversations costs one roundtrip instead of K + 2
+        result = await db.execute(
+            select(Conversation, func.count(Message.id))
+            .join(User, Conversation.user_id == User.id)
+            .outerjoin(Message, Message.conversation_id == Conversation.id)
+            .where(
+                func.lower(User.email) == user_email.lower(),
+                Conversation.is_active == True
+            )
+            .group_by(Conversation.id)
+            .order_by(Conversation.last_message_at.desc())
+        )
+
+        return [
+            {
                 "session_id": conv.session_id,
                 "title": conv.title,
                 "started_at": conv.started_at.isoformat(),
                 "last_message_at": conv.last_message_at.isoformat() if conv.last_message_at else None,
                 "message_count": msg_count
-            })
-        
-        return result
+            }
+            for conv, msg_count in result.all()
+        ]
 
 # Global instance
-chat_service = ChatService()
\ No newline at end of file
+chat_service = ChatService()
@@ -1,18 +1,31 @@
+import hashlib
 import os
 import aiofiles
+import numpy as np
 from pathlib import Path
-from typing import List, Optional
+from typing import BinaryIO, List, Optional, Tuple
 import uuid
 from PyPDF2 import PdfReader
 from docx import Document as DocxDocument
 
+# PyMuPDF's C extractor is ~5-10x faster than PyPDF2's pure-Python one;
+# fall back to PyPDF2 where it isn't installed
+try:
+    import fitz
+except ImportError:
+    fitz = None
+
 from io import BytesIO
 
-from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import get_settings
 from app.models.documents import Document, DocumentChunk
-from app.services.embedding_service import embedding_service
+from app.services.embedding_service import EMBED_BATCH_SIZE, embedding_service
 from app.services.vector_service import vector_service
 
+settings = get_settings()
+
 class DocumentService:
     def __init__(self):
         # Create documents directory
@@ -20,33 +33,42 @@ class DocumentService:
         self.upload_dir.mkdir(parents=True, exist_ok=True)
         
         # Allowed file extensions
-        self.allowed_extensions = {".pdf", ".docx", ".txt", ".md"}
+        self.allowed_extensions = settings.allowed_extensions_set
         
         # Text chunking settings
         self.chunk_size = 1000  # characters per chunk
         self.chunk_overlap = 200  # overlap between chunks
     
-    async def save_uploaded_file(self, file_content: bytes, filename: str) -> str:
+    async def save_uploaded_file(self, file: BinaryIO, filename: str) -> Tuple[str, str]:
         """
-        Save uploaded file to disk
+        Save an uploaded file to disk in chunks, hashing as it streams
         
         Args:
-            file_content: File content as bytes
+            file: File-like object positioned anywhere (it is rewound first)
             filename: Original filename
             
         Returns:
-            Path to saved file
+            (path to saved file, SHA-256 hex digest of the contents)
         """
         # Generate unique filename
         file_extension = Path(filename).suffix
         unique_filename = f"{uuid.uuid4()}{file_extension}"
         file_path = self.upload_dir / unique_filename
         
-        # Save file asynchronously
+        # Save file asynchronously, 1MB at a time so large uploads never
+        # sit fully in memory; the dedup hash rides the same pass over
+        # the bytes instead of re-reading the file afterwards
+        # usedforsecurity=False lets FIPS-constrained OpenSSL builds use
+        # the fastest sha256 implementation; on SHA-NI CPUs the digest
+        # then runs near memory bandwidth
+        hasher = hashlib.sha256(usedforsecurity=False)
+        file.seek(0)
         async with aiofiles.open(file_path, "wb") as f:
-            await f.write(file_content)
+            while chunk := file.read(1024 * 1024):
+                hasher.update(chunk)
+                await f.write(chunk)
         
-        return str(file_path)
+        return str(file_path), hasher.hexdigest()
     
     def extract_text_from_file(self, file_path: str) -> str:
         """
@@ -71,27 +93,27 @@ class DocumentService:
     
     def _extract_from_pdf(self, file_path: str) -> str:
         """Extract text from PDF file"""
+        if fitz is not None:
+            with fitz.open(file_path) as pdf:
+                return "\n".join(page.get_text() for page in pdf)
+        
         with open(file_path, "rb") as file:
             pdf_reader = PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text
+            # Collect pages and join once: += on str recopies the whole
+            # accumulated text per page (O(N^2) on large PDFs)
+            return "\n".join(page.extract_text() or "" for page in pdf_reader.pages)
     
     def _extract_from_docx(self, file_path: str) -> str:
         """Extract text from Word document"""
         doc = DocxDocument(file_path)
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text
+        return "\n".join(paragraph.text for paragraph in doc.paragraphs)
     
     def _extract_from_text(self, file_path: str) -> str:
         """Extract text from plain text files"""
         with open(file_path, "r", encoding="utf-8") as file:
             return file.read()
     
-    def chunk_text(self, text: str) -> List[str]:
+    def chunk_text(self, text: str) -> List[Tuple[str, int, int]]:
         """
         Split text into overlapping chunks for better search
         
@@ -99,8 +121,19 @@ class DocumentService:
             text: Input text to chunk
             
         Returns:
-            List of text chunks
+            List of (chunk, start_char, end_char) tuples, offsets into
+            the original text
         """
+        # All space positions found once by a vectorized byte scan; each
+        # word boundary is then a searchsorted instead of an O(chunk_size)
+        # reverse scan per chunk. Byte offsets only equal character
+        # offsets for ASCII text, so anything else takes the rfind path.
+        space_positions = None
+        if text.isascii():
+            space_positions = np.flatnonzero(
+                np.frombuffer(text.encode(), dtype=np.uint8) == 0x20
+            )
+        
         chunks = []
         text_length = len(text)
         
@@ -112,38 +145,44 @@ class DocumentService:
             # If not at the end, try to break at word boundary
             if end < text_length:
                 # Find last space within chunk to avoid breaking words
-                last_space = text.rfind(" ", start, end)
+                if space_positions is not None:
+                    idx = np.searchsorted(space_positions, end) - 1
+                    last_space = int(space_positions[idx]) if idx >= 0 else -1
+                else:
+                    last_space = text.rfind(" ", start, end)
                 if last_space > start:
                     end = last_space
             
             # Extract chunk
             chunk = text[start:end].strip()
             if chunk:  # Only add non-empty chunks
-                chunks.append(chunk)
+                chunks.append((chunk, start, end))
             
-            # Move start position with overlap
-            start = end - self.chunk_overlap
-            if start <= 0:
-                start = end
+            # Move start position with overlap, always advancing: a break
+            # point close behind start used to make end - overlap land at
+            # or before the previous start and spin forever
+            start = max(start + 1, end - self.chunk_overlap)
         
         return chunks
     
     async def process_document(
         self, 
-        db: Session,
-        file_content: bytes,
+        db: AsyncSession,
+        file: BinaryIO,
+        file_size: int,
         filename: str,
         title: str,
         department: str,
         content_type: str,
         uploaded_by: str
-    ) -> Document:
+    ) -> Tuple[Document, int]:
         """
         Complete document processing pipeline
         
         Args:
             db: Database session
-            file_content: File content as bytes
+            file: File-like object with the uploaded content
+            file_size: Upload size in bytes
             filename: Original filename
             title: Document title
             department: Department that owns the document
@@ -151,10 +190,28 @@ class DocumentService:
             uploaded_by: User who uploaded the document
             
         Returns:
-            Created Document object
+            Tuple of (created Document, number of chunks created)
         """
         # 1. Save file to disk
-        file_path = await self.save_uploaded_file(file_content, filename)
+        file_path, content_hash = await self.save_uploaded_file(file, filename)
+        
+        # Identical bytes already ingested: drop the fresh copy and skip
+        # extraction, chunking and embedding entirely
+        result = await db.execute(
+            select(Document).where(
+                Document.content_hash == content_hash,
+                Document.is_active == True
+            )
+        )
+        existing = result.scalars().first()
+        if existing is not None:
+            os.remove(file_path)
+            count_result = await db.execute(
+                select(func.count()).select_from(DocumentChunk).where(
+                    DocumentChunk.document_id == existing.id
+                )
+            )
+            return existing, count_result.scalar()
         
         # 2. Extract text content
         text_content = self.extract_text_from_file(file_path)
@@ -165,50 +222,63 @@ class DocumentService:
             file_path=file_path,
             department=department,
             content_type=content_type,
-            file_size=len(file_content),
+            file_size=file_size,
             original_filename=filename,
+            content_hash=content_hash,
             uploaded_by=uploaded_by
         )
         
         db.add(document)
-        db.commit()
-        db.refresh(document)
+        await db.commit()
+        await db.refresh(document)
         
         # 4. Chunk the text
         chunks = self.chunk_text(text_content)
+        chunk_texts = [chunk for chunk, _, _ in chunks]
         
-        # 5. Generate embeddings and store chunks
-        for i, chunk_text in enumerate(chunks):
-            # Generate embedding for this chunk
-            embedding = embedding_service.generate_embedding(chunk_text)
+        # 5. Generate embeddings and store chunks in embedding-batch-sized
+        # slices: each slice is one Gemini call and one vector-store add,
+        # and the slice's embeddings are released before the next one, so
+        # peak memory is bounded by the batch rather than the document
+        if chunks:
+            chunk_ids = []
+            for batch_start in range(0, len(chunks), EMBED_BATCH_SIZE):
+                batch_texts = chunk_texts[batch_start:batch_start + EMBED_BATCH_SIZE]
+                embeddings = embedding_service.generate_embeddings_batch(batch_texts)
+                chunk_ids.extend(vector_service.add_document_chunks(
+                    chunk_texts=batch_texts,
+                    embeddings=embeddings,
+                    metadatas=[
+                        {
+                            "document_id": document.id,
+                            "chunk_index": i,
+                            "title": title,
+                            "department": department,
+                            "content_type": content_type
+                        }
+                        for i in range(batch_start, batch_start + len(batch_texts))
+                    ]
+                ))
             
-            # Store in vector database
-            chunk_id = vector_service.add_document_chunk(
-                chunk_text=chunk_text,
-                embedding=embedding,
-                metadata={
+            # Offsets come straight from chunk_text; the old
+            # i * (chunk_size - overlap) arithmetic drifted from reality
+            # as soon as a chunk broke at a word boundary
+            chunk_rows = [
+                {
                     "document_id": document.id,
+                    "content": chunk_text,
                     "chunk_index": i,
-                    "title": title,
-                    "department": department,
-                    "content_type": content_type
+                    "start_char": start_char,
+                    "end_char": end_char,
+                    "vector_id": chunk_id
                 }
-            )
-            
-            # Store chunk metadata in SQL database
-            document_chunk = DocumentChunk(
-                document_id=document.id,
-                content=chunk_text,
-                chunk_index=i,
-                start_char=i * (self.chunk_size - self.chunk_overlap),
-                end_char=(i + 1) * (self.chunk_size - self.chunk_overlap),
-                vector_id=chunk_id
-            )
-            
-            db.add(document_chunk)
+                for i, ((chunk_text, start_char, end_char), chunk_id)
+                in enumerate(zip(chunks, chunk_ids))
+            ]
+            await db.execute(insert(DocumentChunk).values(chunk_rows))
         
-        db.commit()
-        return document
+        await db.commit()
+        return document, len(chunks)
 
 # Global instance
 document_service = DocumentService()
\ No newline at end of file
@@ -1,9 +1,195 @@
 import google.generativeai as genai
-from typing import List
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
 import numpy as np
 import os
+import re
 from dotenv import load_dotenv
 
+# Numba JIT-compiles the batched cosine kernel to SIMD FMAs with no
+# temporaries; without it the NumPy fallback is still one BLAS matmul
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+# Torch is only used for its CUDA backend; brute-force cosine over a
+# large matrix is embarrassingly parallel and a modest GPU sustains
+# orders of magnitude more FMAs per cycle than the CPU path
+try:
+    import torch
+except ImportError:
+    torch = None
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Gemini accepts up to 100 texts per embed_content request; batches
+# beyond that are fanned out over a small thread pool since the calls
+# are pure network I/O
+EMBED_BATCH_SIZE = 100
+EMBED_MAX_WORKERS = 8
+
+
+class _EmbeddingCache:
+    """Persistent embedding cache keyed by sha256(model|text)
+
+    Survives restarts so re-ingesting overlapping content never re-pays
+    the Gemini call. Vectors are stored as raw float32 bytes (3 KB per
+    768-dim embedding); the model name is part of the key, so switching
+    models invalidates naturally.
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embed_cache (key BLOB PRIMARY KEY, vec BLOB)"
+        )
+        self._conn.commit()
+        # One connection shared across the embed thread pool
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model_name: str, text: str) -> bytes:
+        return hashlib.sha256(
+            (model_name + "|" + text).encode(), usedforsecurity=False
+        ).digest()
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vec FROM embed_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        # frombuffer over the blob is zero-copy and read-only, exactly
+        # what a shared cached vector should be
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def put_many(self, items: List[Tuple[bytes, np.ndarray]]):
+        rows = [
+            (key, np.asarray(vec, dtype=np.float32).tobytes())
+            for key, vec in items
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embed_cache (key, vec) VALUES (?, ?)", rows
+            )
+            self._conn.commit()
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _cosine_batch_kernel(q, M, q_normsq):
+        n_rows = M.shape[0]
+        dim = M.shape[1]
+        out = np.empty(n_rows, dtype=np.float32)
+        for i in prange(n_rows):
+            dot = np.float32(0.0)
+            normsq = np.float32(0.0)
+            for j in range(dim):
+                dot += q[j] * M[i, j]
+                normsq += M[i, j] * M[i, j]
+            denom = np.sqrt(normsq * q_normsq)
+            out[i] = dot / denom if denom > 0.0 else np.float32(0.0)
+        return out
+
+
+class EmbeddingMatrix:
+    """Contiguous float32 matrix for bulk in-process similarity scoring
+
+    Rows are L2-normalized at insert, so scoring k nearest of N stored
+    vectors is a single BLAS matrix-vector product plus an argpartition
+    instead of N Python-level dot/norm round trips. Chroma remains the
+    system of record; this is an in-memory accelerator for hot sets.
+
+    Brute-force scans are memory-bound, so dtype=np.float16 halves both
+    footprint and bandwidth (768-dim: 1.5 KB/row instead of 3 KB) for a
+    sub-1% recall cost on normalized embeddings.
+    """
+
+    def __init__(self, dim: int, initial_capacity: int = 1024, dtype=np.float32):
+        if dtype not in (np.float32, np.float16):
+            raise ValueError("dtype must be np.float32 or np.float16")
+        self._dim = dim
+        self._dtype = dtype
+        self._buffer = np.empty((initial_capacity, dim), dtype=dtype)
+        self._count = 0
+        # Device-side copy of the matrix, rebuilt lazily when rows were
+        # added since the last search; None when CUDA is unavailable
+        self._use_gpu = torch is not None and torch.cuda.is_available()
+        self._gpu_matrix = None
+        self._gpu_count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, embedding: List[float]) -> int:
+        """Append a vector (normalized in place); returns its row index"""
+        if self._count == self._buffer.shape[0]:
+            grown = np.empty((self._buffer.shape[0] * 2, self._dim), dtype=self._dtype)
+            grown[:self._count] = self._buffer[:self._count]
+            self._buffer = grown
+
+        # Normalize in float32 before any downcast so quantization error
+        # lands on an already-unit vector
+        row = np.asarray(embedding, dtype=np.float32)
+        norm = np.sqrt(np.vdot(row, row))
+        if norm > 0.0:
+            row = row / norm
+        self._buffer[self._count] = row
+        self._count += 1
+        return self._count - 1
+
+    def get(self, index: int) -> List[float]:
+        """Stored (normalized) vector as float32, whatever the storage dtype"""
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return self._buffer[index].astype(np.float32).tolist()
+
+    def _gpu_scores(self, q: np.ndarray) -> np.ndarray:
+        """Score on the GPU, refreshing the device matrix only when stale
+
+        Rows are already normalized, so the whole scan is one fp16 GEMV
+        on-device; only the N float32 scores come back over PCIe.
+        """
+        if self._gpu_matrix is None or self._gpu_count != self._count:
+            self._gpu_matrix = torch.from_numpy(
+                self._buffer[:self._count].astype(np.float16)
+            ).cuda()
+            self._gpu_count = self._count
+        q_t = torch.from_numpy(q.astype(np.float16)).cuda()
+        return (self._gpu_matrix @ q_t).float().cpu().numpy()
+
+    def search(self, query: List[float], k: int = 5) -> List[Tuple[int, float]]:
+        """Top-k (row index, cosine similarity) pairs for a query vector"""
+        if self._count == 0:
+            return []
+
+        q = np.asarray(query, dtype=np.float32)
+        norm = np.sqrt(np.vdot(q, q))
+        if norm > 0.0:
+            q = q / norm
+
+        if self._use_gpu:
+            scores = self._gpu_scores(q)
+        else:
+            # Matching the storage dtype keeps the scan at storage
+            # bandwidth; float16 scores are ranked in float32 to avoid
+            # tie artifacts
+            scores = (self._buffer[:self._count] @ q.astype(self._dtype)).astype(np.float32)
+        k = min(k, self._count)
+        # argpartition gets the top k in O(N); only those k get sorted
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+
 class EmbeddingService:
     def __init__(self):
         """
@@ -19,40 +205,160 @@ class EmbeddingService:
         genai.configure(api_key=api_key)
         self.model_name = "models/embedding-001"
 
-    def generate_embedding(self, text: str) -> List[float]:
+        # On-disk cache so identical text never hits the API twice,
+        # even across restarts
+        self._disk_cache = _EmbeddingCache("data/embed_cache.sqlite")
+
+        # Per-instance LRU for query embeddings: hot queries recur constantly
+        # and each model call costs ~50-200ms
+        self._cached_query_embedding = lru_cache(maxsize=4096)(self._embed_query)
+
+        # Same idea in front of the disk cache for arbitrary texts:
+        # repeats within one process return the shared read-only array
+        # without even the sqlite read. Embedding is pure in the input
+        # text for a fixed model, so memoization is safe.
+        self._cached_embedding = lru_cache(maxsize=4096)(self._generate_embedding_uncached)
+
+    def _embed_query(self, normalized_text: str) -> np.ndarray:
+        return self.generate_embedding(normalized_text)
+
+    def generate_query_embedding(self, text: str) -> np.ndarray:
+        """
+        Embedding for a search query, cached on the normalized query text
         """
-        Convert text to vector embedding using Gemini
+        normalized = _WHITESPACE_RE.sub(" ", text.strip().lower())
+        return self._cached_query_embedding(normalized)
+
+    def generate_embedding(self, text: str) -> np.ndarray:
+        """
+        Convert text to a float32 embedding vector using Gemini
+
+        A 768-dim float32 array is ~3 KB against ~30 KB of boxed Python
+        floats, so vectors stay ndarrays everywhere internally and only
+        become lists at client boundaries that insist on them.
         """
+        return self._cached_embedding(text)
+
+    def _generate_embedding_uncached(self, text: str) -> np.ndarray:
+        key = self._disk_cache.key(self.model_name, text)
+        cached = self._disk_cache.get(key)
+        if cached is not None:
+            return cached
+
         response = genai.embed_content(
             model=self.model_name,
             content=text
         )
-        return response["embedding"]
+        vector = np.asarray(response["embedding"], dtype=np.float32)
+        vector.setflags(write=False)  # cached vectors are shared
+        self._disk_cache.put_many([(key, vector)])
+        return vector
+
+    def _embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """One embed_content round-trip for up to EMBED_BATCH_SIZE texts"""
+        response = genai.embed_content(
+            model=self.model_name,
+            content=texts
+        )
+        return [
+            np.asarray(embedding, dtype=np.float32)
+            for embedding in response["embedding"]
+        ]
 
-    def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+    def generate_embeddings_batch(self, texts: List[str]) -> List[np.ndarray]:
         """
         Generate embeddings for multiple texts at once
+
+        Texts go to the API in batches of EMBED_BATCH_SIZE rather than
+        one HTTPS round-trip each; multiple batches run concurrently,
+        and texts already in the disk cache skip the API entirely.
         """
-        embeddings = []
-        for text in texts:
-            response = genai.embed_content(
-                model=self.model_name,
-                content=text
-            )
-            embeddings.append(response["embedding"])
+        if not texts:
+            return []
+
+        keys = [self._disk_cache.key(self.model_name, text) for text in texts]
+        embeddings: List[Optional[np.ndarray]] = [
+            self._disk_cache.get(key) for key in keys
+        ]
+        miss_indices = [i for i, e in enumerate(embeddings) if e is None]
+        if not miss_indices:
+            return embeddings
+
+        misses = [texts[i] for i in miss_indices]
+        batches = [
+            misses[i:i + EMBED_BATCH_SIZE]
+            for i in range(0, len(misses), EMBED_BATCH_SIZE)
+        ]
+        if len(batches) == 1:
+            fresh = self._embed_batch(batches[0])
+        else:
+            with ThreadPoolExecutor(max_workers=min(EMBED_MAX_WORKERS, len(batches))) as pool:
+                results = pool.map(self._embed_batch, batches)
+            fresh = [embedding for batch in results for embedding in batch]
+
+        for i, embedding in zip(miss_indices, fresh):
+            embeddings[i] = embedding
+        self._disk_cache.put_many(
+            [(keys[i], embedding) for i, embedding in zip(miss_indices, fresh)]
+        )
         return embeddings
 
+    def iter_embeddings(
+        self, texts: List[str], batch_size: int = EMBED_BATCH_SIZE
+    ) -> Iterator[np.ndarray]:
+        """
+        Yield embeddings batch by batch instead of materializing them all
+
+        Peak memory stays at one batch of vectors however large the
+        document; consumers that flush downstream per batch never hold
+        the whole document's embeddings at once.
+        """
+        for start in range(0, len(texts), batch_size):
+            yield from self.generate_embeddings_batch(texts[start:start + batch_size])
+
     def calculate_similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
         """
         Calculate cosine similarity between two embeddings
         """
-        vec1 = np.array(embedding1)
-        vec2 = np.array(embedding2)
-        dot_product = np.dot(vec1, vec2)
-        norm1 = np.linalg.norm(vec1)
-        norm2 = np.linalg.norm(vec2)
-        return float(dot_product / (norm1 * norm2))
+        # vdot skips linalg.norm's axis/type dispatch and folds the two
+        # sqrt calls into one; on 768-dim vectors that overhead dominates
+        vec1 = np.asarray(embedding1, dtype=np.float32)
+        vec2 = np.asarray(embedding2, dtype=np.float32)
+        denominator = np.sqrt(np.vdot(vec1, vec1) * np.vdot(vec2, vec2))
+        if denominator == 0.0:
+            return 0.0
+        return float(np.dot(vec1, vec2) / denominator)
+
+    def calculate_similarity_batch(
+        self, query: List[float], embeddings: List[List[float]]
+    ) -> List[float]:
+        """
+        Cosine similarity of one query against many candidates at once
+
+        One fused pass over the candidate matrix (JIT-compiled when numba
+        is installed) instead of a calculate_similarity call per pair.
+        """
+        if not embeddings:
+            return []
+
+        q = np.asarray(query, dtype=np.float32)
+        M = np.asarray(embeddings, dtype=np.float32)
+        q_normsq = np.float32(np.vdot(q, q))
+
+        if njit is not None:
+            return _cosine_batch_kernel(q, M, q_normsq).tolist()
+
+        denominators = np.sqrt(np.einsum("ij,ij->i", M, M) * q_normsq)
+        scores = np.divide(
+            M @ q,
+            denominators,
+            out=np.zeros(M.shape[0], dtype=np.float32),
+            where=denominators > 0.0
+        )
+        return scores.tolist()
 
 
-# Global instance
+# Global instance: genai.configure runs once and the SDK keeps a
+# pooled transport underneath, so per-call embed_content requests
+# reuse the same TLS connection
 embedding_service = EmbeddingService()
@@ -1,9 +1,38 @@
 import chromadb
+import numpy as np
 from chromadb.config import Settings
 from typing import List, Dict, Optional
 import uuid
 from pathlib import Path
 
+from app.services.embedding_service import EmbeddingMatrix
+
+# Above this size a brute-force RAM scan loses to Chroma's ANN index
+# and the mirror stops being consulted
+FAST_SCAN_MAX_CHUNKS = 100_000
+
+# HNSW build/search parameters for the collection. Vectors are
+# L2-normalized before every add and query, so inner-product space gives
+# the same ranking as cosine (distance = 1 - dot, which downstream turns
+# back into relevance via 1 - distance) while the hot HNSW distance
+# kernel skips the per-comparison sqrt and divide. M=32 and
+# construction_ef=200 buy recall at build time, search_ef=64 is the
+# query-time recall/latency dial (raise via set_search_ef if recall at
+# high corpus sizes ever drops). Applied on collection (re)creation.
+_COLLECTION_METADATA = {
+    "description": "Company documentation embeddings",
+    "hnsw:space": "ip",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64,
+}
+
+def _normalize_rows(embeddings: List[List[float]]) -> List[List[float]]:
+    """L2-normalize a batch of vectors in one vectorized pass"""
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / (norms + 1e-12)).tolist()
+
 class VectorService:
     def __init__(self):
         # Persistent ChromaDB storage path
@@ -16,25 +45,60 @@ class VectorService:
         )
         
         self.collection_name = "company_documents"
-        # Create or get the documents collection
+        # Create or get the documents collection. An existing collection
+        # keeps the parameters it was built with; run reset_collection
+        # (and re-ingest) once to migrate to the tuned settings.
         self.collection = self.client.get_or_create_collection(
             name=self.collection_name,
-            metadata={"description": "Company documentation embeddings"}
+            metadata=_COLLECTION_METADATA
         )
 
-    def reset_collection(self):
+        # In-process mirror of the stored vectors: top-k over it is one
+        # matmul streamed from RAM, skipping Chroma's query/deserialize
+        # layer. Only rows added through this process are mirrored, so
+        # the fast path checks coverage against collection.count() and
+        # falls back to Chroma when the mirror is stale or partial.
+        self._mirror: Optional[EmbeddingMatrix] = None
+        self._mirror_ids: List[str] = []
+        self._mirror_metadatas: List[Dict] = []
+
+    def _invalidate_mirror(self):
+        self._mirror = None
+        self._mirror_ids = []
+        self._mirror_metadatas = []
+
+    def reset_collection(self, recreate: bool = False):
         """
-        Delete and recreate the entire ChromaDB collection.
+        Empty the ChromaDB collection.
+
+        The default deletes the stored vectors in place, which keeps the
+        collection handle and skips tearing down and re-initializing the
+        HNSW index - the common clear-between-runs case. Pass
+        recreate=True to rebuild from scratch when the collection
+        parameters themselves changed (e.g. after editing
+        _COLLECTION_METADATA).
         """
         try:
-            self.client.delete_collection(name=self.collection_name)
-            self.collection = self.client.get_or_create_collection(
-                name=self.collection_name,
-                metadata={"description": "Company documentation embeddings"}
-            )
+            if recreate:
+                self.client.delete_collection(name=self.collection_name)
+                self.collection = self.client.get_or_create_collection(
+                    name=self.collection_name,
+                    metadata=_COLLECTION_METADATA
+                )
+            else:
+                all_ids = self.collection.get(include=[])["ids"]
+                if all_ids:
+                    self.collection.delete(ids=all_ids)
+            self._invalidate_mirror()
             print(f"Collection '{self.collection_name}' has been reset.")
         except Exception as e:
             print(f"Error resetting collection: {e}")
+
+    def set_search_ef(self, search_ef: int):
+        """
+        Adjust HNSW search_ef at runtime: higher trades latency for recall.
+        """
+        self.collection.modify(metadata={**_COLLECTION_METADATA, "hnsw:search_ef": search_ef})
     
     def add_document_chunk(
         self, 
@@ -43,38 +107,179 @@ class VectorService:
         metadata: Dict,
         chunk_id: Optional[str] = None
     ) -> str:
-        if chunk_id is None:
-            chunk_id = str(uuid.uuid4())
-        
-        self.collection.add(
-            documents=[chunk_text],
+        """Single-chunk convenience wrapper over add_document_chunks"""
+        return self.add_document_chunks(
+            chunk_texts=[chunk_text],
             embeddings=[embedding],
             metadatas=[metadata],
-            ids=[chunk_id]
+            chunk_ids=None if chunk_id is None else [chunk_id]
+        )[0]
+    
+    def add_document_chunks(
+        self,
+        chunk_texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict],
+        chunk_ids: Optional[List[str]] = None
+    ) -> List[str]:
+        """
+        Add a whole document's chunks in one collection.add call.
+        """
+        if chunk_ids is None:
+            chunk_ids = [str(uuid.uuid4()) for _ in chunk_texts]
+
+        normalized = _normalize_rows(embeddings)
+        self.collection.add(
+            documents=chunk_texts,
+            embeddings=normalized,
+            metadatas=metadatas,
+            ids=chunk_ids
         )
-        return chunk_id
+
+        if len(self._mirror_ids) + len(chunk_ids) <= FAST_SCAN_MAX_CHUNKS:
+            if self._mirror is None:
+                self._mirror = EmbeddingMatrix(dim=len(normalized[0]))
+            for row, chunk_id, metadata in zip(normalized, chunk_ids, metadatas):
+                self._mirror.add(row)
+                self._mirror_ids.append(chunk_id)
+                self._mirror_metadatas.append(metadata)
+        else:
+            self._invalidate_mirror()
+
+        return chunk_ids
     
     def search_similar_chunks(
-        self, 
-        query_embedding: List[float], 
-        n_results: int = 5
+        self,
+        query_embedding: List[float],
+        n_results: int = 5,
+        where: Optional[Dict] = None,
+        include: Optional[List[str]] = None
     ) -> Dict:
+        """
+        Nearest chunks for a query embedding.
+
+        include trims what crosses the Chroma boundary: candidate-only
+        callers (reranking over dozens of hits) should pass
+        ["distances", "metadatas"] so the chunk texts - by far the
+        largest field - are never serialized, and fetch the few texts
+        they keep via get_chunks_by_ids. The default returns everything
+        the chat path feeds straight to the LLM.
+        """
+        if include is None:
+            include = ["documents", "distances", "metadatas"]
         results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results
+            query_embeddings=_normalize_rows([query_embedding]),
+            n_results=n_results,
+            where=where,
+            include=include
         )
-        
+
+        flattened = {"ids": results["ids"][0]}
+        for field in ("documents", "distances", "metadatas", "embeddings"):
+            if results.get(field) is not None:
+                flattened[field] = results[field][0]
+        return flattened
+
+    def search_similar_chunks_fast(
+        self,
+        query_embedding: List[float],
+        n_results: int = 5,
+        where: Optional[Dict] = None
+    ) -> Dict:
+        """
+        search_similar_chunks via the in-RAM mirror when it can answer.
+
+        The mirror is used only when it covers the whole collection, no
+        metadata filter is requested and the corpus is small enough that
+        a brute-force matmul beats the ANN round-trip; anything else
+        falls straight through to Chroma with identical results.
+        """
+        usable = (
+            where is None
+            and self._mirror is not None
+            and len(self._mirror) == self.collection.count()
+        )
+        if not usable:
+            return self.search_similar_chunks(query_embedding, n_results, where)
+
+        hits = self._mirror.search(query_embedding, k=n_results)
+        picked_ids = [self._mirror_ids[i] for i, _ in hits]
+        texts = self.get_chunks_by_ids(picked_ids)
+        text_by_id = dict(zip(texts["ids"], texts["documents"]))
         return {
-            "documents": results["documents"][0],
-            "distances": results["distances"][0],
-            "metadatas": results["metadatas"][0],
-            "ids": results["ids"][0]
+            "documents": [text_by_id[chunk_id] for chunk_id in picked_ids],
+            "distances": [1.0 - score for _, score in hits],
+            "metadatas": [self._mirror_metadatas[i] for i, _ in hits],
+            "ids": picked_ids
         }
+
+    def search_similar_chunks_mmr(
+        self,
+        query_embedding: List[float],
+        n_results: int = 5,
+        fetch_k: Optional[int] = None,
+        lambda_mult: float = 0.5,
+        where: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Maximal Marginal Relevance search: diverse top-n instead of raw
+        nearest neighbors.
+
+        Long documents often fill the plain top-n with near-duplicate
+        chunks the LLM then pays tokens for. This fetches a wider
+        candidate set (without their texts), greedily picks n maximizing
+        lambda*sim(q, d) - (1-lambda)*max sim(d, selected) over the
+        stored unit vectors, and only fetches the texts of the winners.
+        """
+        if fetch_k is None:
+            fetch_k = 3 * n_results
+
+        candidates = self.search_similar_chunks(
+            query_embedding,
+            n_results=fetch_k,
+            where=where,
+            include=["distances", "metadatas", "embeddings"]
+        )
+        ids = candidates["ids"]
+        if not ids:
+            return {"documents": [], "distances": [], "metadatas": [], "ids": []}
+
+        # Rows come back normalized (they were normalized at add time),
+        # so every similarity below is a plain dot product
+        matrix = np.asarray(candidates["embeddings"], dtype=np.float32)
+        query = np.asarray(_normalize_rows([query_embedding])[0], dtype=np.float32)
+        query_sims = matrix @ query
+
+        n_results = min(n_results, len(ids))
+        selected = [int(np.argmax(query_sims))]
+        while len(selected) < n_results:
+            redundancy = (matrix @ matrix[selected].T).max(axis=1)
+            scores = lambda_mult * query_sims - (1.0 - lambda_mult) * redundancy
+            scores[selected] = -np.inf
+            selected.append(int(np.argmax(scores)))
+
+        picked_ids = [ids[i] for i in selected]
+        texts = self.get_chunks_by_ids(picked_ids)
+        text_by_id = dict(zip(texts["ids"], texts["documents"]))
+        return {
+            "documents": [text_by_id[chunk_id] for chunk_id in picked_ids],
+            "distances": [float(1.0 - query_sims[i]) for i in selected],
+            "metadatas": [candidates["metadatas"][i] for i in selected],
+            "ids": picked_ids
+        }
+
+    def get_chunks_by_ids(self, chunk_ids: List[str]) -> Dict:
+        """Fetch stored texts (and metadata) for an id shortlist"""
+        return self.collection.get(
+            ids=chunk_ids, include=["documents", "metadatas"]
+        )
     
     def delete_document_chunks(self, document_id: int):
         results = self.collection.get(where={"document_id": document_id})
         if results["ids"]:
             self.collection.delete(ids=results["ids"])
+            # Cheaper to drop the mirror than to compact it in place
+            self._invalidate_mirror()
     
     def get_collection_stats(self) -> Dict:
         count = self.collection.count()
@@ -83,5 +288,7 @@ class VectorService:
             "collection_name": self.collection.name
         }
 
-# Global instance
+# Global instance: one PersistentClient per process. Chroma runs
+# embedded here (no HTTP hop), so every call reuses the same handle
+# and the mmap'd index instead of reconnecting
 vector_service = VectorService()
@@ -1,9 +1,14 @@
 # debug_endpoints.py
 import requests
 import json
+from requests.adapters import HTTPAdapter
 
 API_BASE = "http://localhost:8000"
 
+# Shared session: keep-alive spares the TCP handshake on every probe
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+
 def test_endpoints():
     print("Testing API Endpoints...")
     print("=" * 50)
@@ -11,7 +16,7 @@ def test_endpoints():
     # Test 1: Basic health check
     print("1. Testing Health Endpoint:")
     try:
-        response = requests.get(f"{API_BASE}/health")
+        response = SESSION.get(f"{API_BASE}/health")
         print(f"   Status: {response.status_code}")
         if response.status_code == 200:
             health = response.json()
@@ -26,7 +31,7 @@ def test_endpoints():
     # Test 2: Root endpoint
     print("2. Testing Root Endpoint:")
     try:
-        response = requests.get(f"{API_BASE}/")
+        response = SESSION.get(f"{API_BASE}/")
         print(f"   Status: {response.status_code}")
         if response.status_code == 200:
             print(f"   Response: {response.json()}")
@@ -38,7 +43,7 @@ def test_endpoints():
     # Test 3: Documents endpoint
     print("3. Testing Documents List:")
     try:
-        response = requests.get(f"{API_BASE}/api/documents/")
+        response = SESSION.get(f"{API_BASE}/api/documents/")
         print(f"   Status: {response.status_code}")
         if response.status_code == 200:
             docs = response.json()
@@ -54,7 +59,7 @@ def test_endpoints():
     print("4. Testing Chat Conversations:")
     test_email = "test@company.com"
     try:
-        response = requests.get(f"{API_BASE}/api/chat/conversations?user_email={test_email}")
+        response = SESSION.get(f"{API_BASE}/api/chat/conversations?user_email={test_email}")
         print(f"   Status: {response.status_code}")
         if response.status_code == 200:
             convs = response.json()
@@ -70,7 +75,7 @@ def test_endpoints():
     # Test 5: Start conversation
     print("5. Testing Start Conversation:")
     try:
-        response = requests.post(f"{API_BASE}/api/chat/start?user_email={test_email}")
+        response = SESSION.post(f"{API_BASE}/api/chat/start?user_email={test_email}")
         print(f"   Status: {response.status_code}")
         if response.status_code == 200:
             result = response.json()
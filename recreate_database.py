@@ -10,11 +10,19 @@ def recreate_database():
     
     # Import all models to register them
     from app.models import users, auth, documents, conversations
-    
-    # Drop all existing tables
+    from sqlalchemy import text
+
+    # Drop all existing tables. On Postgres a single schema drop replaces
+    # one DDL round-trip per table (and catches tables no longer in the
+    # metadata); elsewhere fall back to drop_all.
     print("Dropping existing tables...")
-    Base.metadata.drop_all(bind=engine)
-    
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            conn.execute(text("DROP SCHEMA public CASCADE"))
+            conn.execute(text("CREATE SCHEMA public"))
+    else:
+        Base.metadata.drop_all(bind=engine)
+
     # Create all tables with new schema
     print("Creating tables with new schema...")
     Base.metadata.create_all(bind=engine)
@@ -1,16 +1,22 @@
+from sqlalchemy import text
+
 from app.services.vector_service import vector_service
-from app.core.database import SessionLocal
-from app.models.documents import Document
+from app.core.database import SessionLocal, engine
 
 def reset_everything():
     # Reset ChromaDB collection
     vector_service.reset_collection()
-    
-    # Optionally reset your SQL database documents table
+
+    # Reset the SQL document tables. TRUNCATE on Postgres clears both
+    # tables and their identity counters in one statement; the ORM
+    # delete missed document_chunks and left sequences running.
     db = SessionLocal()
     try:
-        # Delete all documents from SQL database if you want a fresh start
-        db.query(Document).delete()
+        if engine.dialect.name == "postgresql":
+            db.execute(text("TRUNCATE documents, document_chunks RESTART IDENTITY CASCADE"))
+        else:
+            db.execute(text("DELETE FROM document_chunks"))
+            db.execute(text("DELETE FROM documents"))
         db.commit()
         print("Cleared SQL database")
     except Exception as e:
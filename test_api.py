@@ -1,8 +1,13 @@
 import requests
 import json
+from requests.adapters import HTTPAdapter
 
 BASE_URL = "http://localhost:8000"
 
+# Shared session: keep-alive spares the TCP handshake on every call
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+
 def safe_print_json(response):
     """Try to print response as JSON, fallback to raw text"""
     try:
@@ -43,7 +48,7 @@ def test_document_upload():
         "uploaded_by": "admin@company.com"
     }
     
-    response = requests.post(f"{BASE_URL}/api/documents/upload", files=files, data=data)
+    response = SESSION.post(f"{BASE_URL}/api/documents/upload", files=files, data=data)
     print(f"Upload Status: {response.status_code}")
     safe_print_json(response)
     return response
@@ -57,7 +62,7 @@ def test_document_search():
         "limit": 5
     }
     
-    response = requests.post(f"{BASE_URL}/api/documents/search", json=search_data)
+    response = SESSION.post(f"{BASE_URL}/api/documents/search", json=search_data)
     print(f"Search Status: {response.status_code}")
     safe_print_json(response)
 
@@ -65,7 +70,7 @@ def test_document_search():
 def test_list_documents():
     """Test listing documents"""
     
-    response = requests.get(f"{BASE_URL}/api/documents/")
+    response = SESSION.get(f"{BASE_URL}/api/documents/")
     print(f"List Status: {response.status_code}")
     safe_print_json(response)
 
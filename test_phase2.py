@@ -1,3 +1,5 @@
+import numpy as np
+
 from app.services.embedding_service import embedding_service
 from app.services.vector_service import vector_service
 
@@ -6,20 +8,17 @@ def test_embeddings():
     text1 = "Remote work policy allows working from home"
     text2 = "Employees can work remotely from their house"
     text3 = "Coffee machine maintenance schedule"
-    
-    # Generate embeddings
-    emb1 = embedding_service.generate_embedding(text1)
-    emb2 = embedding_service.generate_embedding(text2)
-    emb3 = embedding_service.generate_embedding(text3)
-    
-    # Test similarity
-    sim_12 = embedding_service.calculate_similarity(emb1, emb2)
-    sim_13 = embedding_service.calculate_similarity(emb1, emb3)
-    
-    print(f"Similarity between remote work texts: {sim_12:.3f}")
-    print(f"Similarity between remote work and coffee: {sim_13:.3f}")
-    
+
+    # Generate all embeddings in one batched call, then compute the full
+    # similarity matrix as a single matmul over the normalized rows
+    embs = np.stack(embedding_service.generate_embeddings_batch([text1, text2, text3]))
+    embs = embs / np.linalg.norm(embs, axis=1, keepdims=True)
+    sim = embs @ embs.T
+
+    print(f"Similarity between remote work texts: {sim[0, 1]:.3f}")
+    print(f"Similarity between remote work and coffee: {sim[0, 2]:.3f}")
+
     # Should show: remote work texts are more similar than unrelated text
 
 if __name__ == "__main__":
-    test_embeddings()
\ No newline at end of file
+    test_embeddings()